@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from backend.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'priority', 'tier', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'tier')
+    readonly_fields = ('result',)
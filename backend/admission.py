@@ -0,0 +1,284 @@
+import functools
+import json
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.http import JsonResponse
+
+controller = None
+controller_lock = threading.Lock()
+
+
+class Rejection(Exception):
+    def __init__(self, reason, status, message, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    # Admits requests of one worker in arrival order, at most `concurrency` at a time, and turns away those that could
+    # not be completed before the deadline, so that an overloaded worker spends its time on requests that still count
+    def __init__(self, concurrency, queue_size, budget, deadline):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.budget = budget
+        self.deadline = deadline
+        self.condition = threading.Condition()
+        self.waiting = deque()
+        self.running = 0
+        self.characters = 0
+
+        # Moving averages of the size and the service time of recent requests and of their variance and covariance,
+        # from which the service time is estimated as a fixed cost per request plus a cost per character
+        self.mean_size = None
+        self.mean_duration = None
+        self.size_variance = 0.0
+        self.covariance = 0.0
+
+    def acquire(self, size, elapsed=0.0):
+        if size > self.budget:
+            raise Rejection("too_large", 413, "The request is longer than %d characters." % self.budget)
+
+        with self.condition:
+            if self.characters + size > self.budget:
+                raise Rejection("budget", 429, "Too much text is being converted, try again later.",
+                                self.get_retry_after())
+
+            if self.running >= self.concurrency and len(self.waiting) >= self.queue_size:
+                raise Rejection("queue_full", 503, "The server is overloaded, try again later.", self.get_retry_after())
+
+            # The request waits for the requests admitted before it, shared by the concurrent slots. An idle worker
+            # could not answer a request any sooner, so it only turns away those the proxy has already given up on.
+            service_time = self.estimate(1, size)
+
+            if self.running or self.waiting:
+                finished = elapsed + self.get_backlog() + service_time
+            else:
+                finished = elapsed
+
+            if finished > self.deadline:
+                raise Rejection("deadline", 503, "The server is overloaded, try again later.", self.get_retry_after())
+
+            ticket = object()
+            self.waiting.append(ticket)
+            self.characters += size
+            end = time.monotonic() + self.deadline - elapsed - service_time
+
+            while self.running >= self.concurrency or self.waiting[0] is not ticket:
+                timeout = end - time.monotonic()
+
+                if timeout <= 0:
+                    self.waiting.remove(ticket)
+                    self.characters -= size
+                    self.condition.notify_all()
+
+                    raise Rejection("timeout", 503, "The server is overloaded, try again later.",
+                                    self.get_retry_after())
+
+                self.condition.wait(timeout)
+
+            self.waiting.popleft()
+            self.running += 1
+            self.condition.notify_all()
+
+    def release(self, size, duration=None):
+        with self.condition:
+            self.running -= 1
+            self.characters -= size
+
+            # Requests answered from the cache are not counted
+            if duration is not None:
+                self.learn(size, duration)
+
+            self.condition.notify_all()
+
+    def learn(self, size, duration):
+        if self.mean_size is None:
+            self.mean_size = size
+            self.mean_duration = duration
+            return
+
+        size_difference = size - self.mean_size
+        duration_difference = duration - self.mean_duration
+
+        self.mean_size += 0.2 * size_difference
+        self.mean_duration += 0.2 * duration_difference
+        self.size_variance = 0.8 * (self.size_variance + 0.2 * size_difference * size_difference)
+        self.covariance = 0.8 * (self.covariance + 0.2 * size_difference * duration_difference)
+
+    def get_costs(self):
+        # Seconds per request and per character, both at least 0. Without different sizes to tell them apart, the
+        # service time is taken to be proportional to the size.
+        slope = self.covariance / self.size_variance if self.size_variance > 0 else 0.0
+        intercept = self.mean_duration - slope * self.mean_size
+
+        if slope <= 0 or intercept < 0:
+            slope = self.mean_duration / self.mean_size if self.mean_size else 0.0
+            intercept = 0.0 if self.mean_size else self.mean_duration
+
+        return intercept, slope
+
+    def estimate(self, requests, characters):
+        if self.mean_size is None:
+            return 0.0
+
+        intercept, slope = self.get_costs()
+
+        return requests * intercept + characters * slope
+
+    def get_backlog(self):
+        return self.estimate(self.running + len(self.waiting), self.characters) / self.concurrency
+
+    def get_retry_after(self):
+        if self.mean_size is None:
+            return settings.NLP_RETRY_AFTER
+
+        return max(1, math.ceil(self.get_backlog()))
+
+    def stats(self):
+        with self.condition:
+            intercept, slope = self.get_costs() if self.mean_size is not None else (None, None)
+
+            return {
+                "running": self.running,
+                "waiting": len(self.waiting),
+                "characters": self.characters,
+                "seconds_per_request": intercept,
+                "seconds_per_character": slope
+            }
+
+
+def get_controller():
+    global controller
+
+    with controller_lock:
+        if controller is None:
+            controller = AdmissionController(
+                settings.NLP_ADMISSION_CONCURRENCY, settings.NLP_ADMISSION_QUEUE_SIZE, settings.NLP_ADMISSION_BUDGET,
+                settings.NLP_ADMISSION_DEADLINE
+            )
+
+    return controller
+
+
+def get_elapsed(request):
+    # Time the request spent in front of the worker, from the X-Request-Start header set by nginx as t=<seconds>
+    header = request.headers.get("X-Request-Start", "")
+
+    try:
+        started = float(header[2:] if header.startswith("t=") else header)
+    except ValueError:
+        return 0.0
+
+    return max(0.0, time.time() - started)
+
+
+def get_text_size(request):
+    return len(request.POST.get("process_description", ""))
+
+
+def get_batch_size(request):
+    # The characters of all process descriptions of the JSON body, an invalid body is rejected by the view
+    try:
+        process_descriptions = json.loads(request.body)
+    except ValueError:
+        return 0
+
+    if not isinstance(process_descriptions, list):
+        return 0
+
+    return sum(len(text) for text in process_descriptions if isinstance(text, str))
+
+
+def admit(get_size=get_text_size):
+    # Requests that would not be answered before the deadline get an immediate 429 or 503 instead of using the CPU
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.NLP_ADMISSION:
+                return view(request, *args, **kwargs)
+
+            size = get_size(request)
+            admission = get_controller()
+
+            try:
+                with request.timings.stage("queue"):
+                    admission.acquire(size, get_elapsed(request))
+            except Rejection as rejection:
+                request.timings.admission = rejection.reason
+                response = JsonResponse({"error": str(rejection)}, status=rejection.status)
+
+                if rejection.retry_after is not None:
+                    response["Retry-After"] = str(rejection.retry_after)
+
+                return response
+
+            request.timings.admission = "admitted"
+            release = Release(admission, size, request.timings)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                release()
+                raise
+
+            # A streaming response converts while it is sent, it is released once it is sent or closed
+            if response.streaming:
+                response.streaming_content = ReleasingIterator(response.streaming_content, release)
+            else:
+                release()
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class Release:
+    def __init__(self, admission, size, timings):
+        self.admission = admission
+        self.size = size
+        self.timings = timings
+        self.start = time.perf_counter()
+        self.released = False
+
+    def __call__(self):
+        if self.released:
+            return
+
+        self.released = True
+        duration = None
+
+        if self.timings.cache != "hit":
+            duration = time.perf_counter() - self.start
+
+        self.admission.release(self.size, duration)
+
+
+class ReleasingIterator:
+    def __init__(self, content, release):
+        self.content = iter(content)
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.release()
+            raise
+
+    def close(self):
+        try:
+            if hasattr(self.content, "close"):
+                self.content.close()
+        finally:
+            self.release()
@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from backend.pipeline import get_pipeline
+
+
+class MicroBatcher:
+    def __init__(self, tier, window, max_batch_size):
+        self.tier = tier
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.queue = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.batches = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.padding = 0.0
+
+    def submit(self, text):
+        future = Future()
+        self.get_queue().put((text, future, time.perf_counter()))
+
+        return future.result()
+
+    def get_queue(self):
+        # The dispatcher thread does not survive a fork, so every worker process starts its own
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.queue = queue.Queue()
+                threading.Thread(target=self.run, args=(self.queue,), name="micro-batcher", daemon=True).start()
+
+            return self.queue
+
+    def run(self, requests):
+        while True:
+            batch = [requests.get()]
+            deadline = time.perf_counter() + self.window
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self.process(batch)
+
+    def process(self, batch):
+        started = time.perf_counter()
+
+        try:
+            nlp = get_pipeline(self.tier)
+        except Exception as error:
+            # The dispatcher thread must survive a pipeline that cannot be loaded, the requests get the error
+            for text, future, queued in batch:
+                future.set_exception(error)
+
+            return
+
+        # Process descriptions of similar length are batched together, so that the transformer pads less
+        batch = sorted(batch, key=lambda item: len(item[0].split()))
+        buckets = []
+
+        for item in batch:
+            length = max(1, len(item[0].split()))
+
+            if buckets and length <= 2 * buckets[-1][0]:
+                buckets[-1][1].append((item, length))
+            else:
+                buckets.append((length, [(item, length)]))
+
+        padding = 0.0
+
+        for minimum, bucket in buckets:
+            lengths = [length for item, length in bucket]
+            padding += len(bucket) * max(lengths) - sum(lengths)
+
+            try:
+                docs = list(nlp.pipe((text for (text, future, queued), length in bucket), batch_size=len(bucket)))
+            except Exception:
+                docs = None
+
+            for index, ((text, future, queued), length) in enumerate(bucket):
+                if docs is not None:
+                    future.set_result(docs[index])
+                    continue
+
+                # A failing batch is retried per process description, so that only the failing one gets the error
+                try:
+                    future.set_result(nlp(text))
+                except Exception as error:
+                    future.set_exception(error)
+
+        total = sum(max(1, len(text.split())) for text, future, queued in batch)
+
+        with self.lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.padding += padding / (padding + total)
+
+            for text, future, queued in batch:
+                self.queue_wait += started - queued
+                self.max_queue_wait = max(self.max_queue_wait, started - queued)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "tier": self.tier, "requests": self.requests, "batches": self.batches,
+                "average_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "average_queue_wait": self.queue_wait / self.requests if self.requests else 0.0,
+                "max_queue_wait": self.max_queue_wait,
+                "average_padding_ratio": self.padding / self.batches if self.batches else 0.0
+            }
+
+
+micro_batchers = {}
+micro_batchers_lock = threading.Lock()
+
+
+def get_micro_batcher(tier=None):
+    tier = tier or settings.NLP_MODEL_TIER
+
+    with micro_batchers_lock:
+        if tier not in micro_batchers:
+            micro_batchers[tier] = MicroBatcher(tier, settings.NLP_MICRO_BATCH_WINDOW, settings.NLP_MICRO_BATCH_SIZE)
+
+        return micro_batchers[tier]
@@ -0,0 +1,204 @@
+import re
+from xml.sax.saxutils import quoteattr
+
+namespaces = (
+    'xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+    'xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" '
+    'xmlns:dc="http://www.omg.org/spec/DD/20100524/DC" '
+    'xmlns:di="http://www.omg.org/spec/DD/20100524/DI"'
+)
+
+# Width and height of the shapes, the same as in the modeler of the frontend
+shape_sizes = {
+    "bpmn:Task": (100, 80),
+    "bpmn:ExclusiveGateway": (50, 50),
+    "bpmn:ParallelGateway": (50, 50)
+}
+event_size = (36, 36)
+
+lane_height = 200
+element_spacing = 150
+lane_offset = 30
+
+ncname_pattern = re.compile(r"^[A-Za-z_][\w.\-]*$")
+
+chunk_size = 65536
+
+
+def serialize_bpmn(elements, name="Organization"):
+    # Yields the BPMN 2.0 XML of the elements in chunks, so that the document is never built as a whole
+    layout = Layout(elements)
+    chunk = []
+    length = 0
+
+    for part in get_parts(elements, layout, name):
+        chunk.append(part)
+        length += len(part)
+
+        if length >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+
+    if chunk:
+        yield "".join(chunk)
+
+
+def to_bpmn(elements, name="Organization"):
+    return "".join(serialize_bpmn(elements, name))
+
+
+class Layout:
+    # Identifiers, lanes, positions and sequence flows of the elements, everything needed ahead of writing them
+    def __init__(self, elements):
+        self.identifiers = []
+        self.references = {}
+        self.lanes = {}
+        self.positions = []
+        self.flows = []
+        self.outgoing = {}
+
+        used = set()
+
+        for index, element in enumerate(elements):
+            identifier = get_xml_identifier(element.identifier)
+
+            # Identifiers must be unique in the XML, a repeated identifier keeps referring to its first element
+            unique_identifier = identifier
+            counter = 1
+
+            while unique_identifier in used:
+                counter += 1
+                unique_identifier = identifier + "_" + str(counter)
+
+            used.add(unique_identifier)
+            self.identifiers.append(unique_identifier)
+            self.references.setdefault(element.identifier, index)
+
+            lane = self.lanes.setdefault(element.actor, (len(self.lanes), []))
+            lane[1].append(index)
+
+            width, height = shape_sizes.get(element.category, event_size)
+            x = lane_offset + 70 + element_spacing * index + (100 - width) // 2
+            y = lane[0] * lane_height + (lane_height - height) // 2
+            self.positions.append((x, y, width, height))
+
+        for index, element in enumerate(elements):
+            if element.predecessor is not None:
+                predecessors = [element.predecessor]
+            else:
+                predecessors = element.predecessors or []
+
+            for predecessor in predecessors:
+                source = self.references.get(predecessor)
+
+                if source is not None:
+                    self.outgoing.setdefault(source, []).append(len(self.flows))
+                    self.flows.append((source, index))
+
+        self.width = lane_offset + 70 + element_spacing * len(elements)
+        self.height = max(1, len(self.lanes)) * lane_height
+
+    def get_flow_name(self, flow, source, category):
+        # The branches of a decision are labeled like in the modeler of the frontend
+        outgoing = self.outgoing[source]
+
+        if category != "bpmn:ExclusiveGateway" or len(outgoing) != 2:
+            return None
+
+        return "Yes" if outgoing[0] == flow else "No"
+
+
+def get_parts(elements, layout, name):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<bpmn:definitions ' + namespaces + ' id="Definitions_1" targetNamespace="http://bpmn.io/schema/bpmn">\n'
+    yield '  <bpmn:collaboration id="Collaboration_1">\n'
+    yield '    <bpmn:participant id="Participant_1" name=' + quoteattr(name) + ' processRef="Process_1" />\n'
+    yield '  </bpmn:collaboration>\n'
+    yield '  <bpmn:process id="Process_1" isExecutable="false">\n'
+    yield '    <bpmn:laneSet id="LaneSet_1">\n'
+
+    for actor, (lane, indexes) in layout.lanes.items():
+        yield '      <bpmn:lane id="Lane_' + str(lane + 1) + '" name=' + quoteattr(str(actor)) + '>\n'
+
+        for index in indexes:
+            yield '        <bpmn:flowNodeRef>' + layout.identifiers[index] + '</bpmn:flowNodeRef>\n'
+
+        yield '      </bpmn:lane>\n'
+
+    yield '    </bpmn:laneSet>\n'
+
+    for index, element in enumerate(elements):
+        yield '    <' + get_tag(element.category) + ' id="' + layout.identifiers[index] + '"'
+
+        if element.value:
+            yield ' name=' + quoteattr(element.value)
+
+        yield ' />\n'
+
+    for flow, (source, target) in enumerate(layout.flows):
+        yield '    <bpmn:sequenceFlow id="Flow_' + str(flow + 1) + '"'
+
+        flow_name = layout.get_flow_name(flow, source, elements[source].category)
+
+        if flow_name:
+            yield ' name="' + flow_name + '"'
+
+        yield ' sourceRef="' + layout.identifiers[source] + '" targetRef="' + layout.identifiers[target] + '" />\n'
+
+    yield '  </bpmn:process>\n'
+    yield '  <bpmndi:BPMNDiagram id="BPMNDiagram_1">\n'
+    yield '    <bpmndi:BPMNPlane id="BPMNPlane_1" bpmnElement="Collaboration_1">\n'
+    yield get_shape("Participant_1", 0, 0, layout.width, layout.height, ' isHorizontal="true"')
+
+    for actor, (lane, indexes) in layout.lanes.items():
+        yield get_shape(
+            "Lane_" + str(lane + 1), lane_offset, lane * lane_height, layout.width - lane_offset, lane_height,
+            ' isHorizontal="true"'
+        )
+
+    for index, element in enumerate(elements):
+        yield get_shape(layout.identifiers[index], *layout.positions[index])
+
+    for flow, (source, target) in enumerate(layout.flows):
+        source_x, source_y, source_width, source_height = layout.positions[source]
+        target_x, target_y, target_width, target_height = layout.positions[target]
+
+        yield '      <bpmndi:BPMNEdge id="Flow_' + str(flow + 1) + '_di" bpmnElement="Flow_' + str(flow + 1) + '">\n'
+        yield get_waypoint(source_x + source_width, source_y + source_height // 2)
+        yield get_waypoint(target_x, target_y + target_height // 2)
+        yield '      </bpmndi:BPMNEdge>\n'
+
+    yield '    </bpmndi:BPMNPlane>\n'
+    yield '  </bpmndi:BPMNDiagram>\n'
+    yield '</bpmn:definitions>\n'
+
+
+def get_shape(identifier, x, y, width, height, attributes=""):
+    return (
+        '      <bpmndi:BPMNShape id="' + identifier + '_di" bpmnElement="' + identifier + '"' + attributes + '>\n'
+        '        <dc:Bounds x="' + str(x) + '" y="' + str(y) + '" width="' + str(width) + '" height="' + str(height) +
+        '" />\n'
+        '      </bpmndi:BPMNShape>\n'
+    )
+
+
+def get_waypoint(x, y):
+    return '        <di:waypoint x="' + str(x) + '" y="' + str(y) + '" />\n'
+
+
+def get_tag(category):
+    # Categories are type names like bpmn:StartEvent, the elements of the XML start in lower case like bpmn:startEvent
+    prefix, name = category.split(":")
+
+    return prefix + ":" + name[0].lower() + name[1:]
+
+
+def get_xml_identifier(identifier):
+    # Identifiers of verbs are token indices, which are no valid XML identifiers on their own
+    identifier = str(identifier)
+
+    if ncname_pattern.match(identifier):
+        return identifier
+
+    return "Element_" + re.sub(r"[^\w.\-]", "_", identifier)
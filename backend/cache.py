@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def normalize_text(text):
+    return unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def get_cache_key(text, *versions):
+    digest = hashlib.sha256()
+
+    for part in versions + (text,):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_size, directory=None, dumps=None, loads=None):
+        self.max_size = max_size
+        self.directory = directory
+        self.dumps = dumps or (lambda value: json.dumps(value).encode("utf-8"))
+        self.loads = loads or json.loads
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+                return self.entries[key]
+
+        value = self.read(key)
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self.remember(key, value)
+
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.remember(key, value)
+
+        self.write(key, value)
+
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+                return self.entries[key]
+
+            owner = key not in self.in_flight
+            future = self.in_flight.setdefault(key, Future())
+
+            if not owner:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            with self.disk_lock(key):
+                value = self.get(key)
+
+                if value is None:
+                    value = compute()
+                    self.set(key, value)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+        return value
+
+    def remember(self, key, value):
+        if self.max_size < 1:
+            return
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def read(self, key):
+        if not self.directory:
+            return None
+
+        try:
+            with open(self.get_path(key), "rb") as file:
+                return self.loads(file.read())
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def write(self, key, value):
+        if not self.directory:
+            return
+
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path), delete=False) as file:
+            file.write(self.dumps(value))
+
+        os.replace(file.name, path)
+
+    @contextmanager
+    def disk_lock(self, key):
+        # Workers sharing the on-disk tier wait for each other instead of all computing the same result. Every key
+        # has a lock file of its own, so that different texts never wait for each other.
+        if not self.directory or fcntl is None:
+            yield
+            return
+
+        path = os.path.join(self.directory, "locks", key[:2], key + ".lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        while True:
+            file = open(path, "a")
+            fcntl.flock(file, fcntl.LOCK_EX)
+
+            # The previous holder removes the lock file, a worker that waited on the removed file tries again
+            try:
+                if os.stat(path).st_ino == os.fstat(file.fileno()).st_ino:
+                    break
+            except OSError:
+                pass
+
+            file.close()
+
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "evictions": self.evictions, "coalesced": self.coalesced
+            }
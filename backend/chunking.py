@@ -0,0 +1,72 @@
+import re
+
+import numpy
+from django.conf import settings
+from spacy.tokens import Doc
+
+from backend.pipeline import get_sentence_boundaries
+
+paragraph_pattern = re.compile(r"\n\s*\n")
+
+
+def get_chunked_doc(nlp, text):
+    # Runs a long text through the pipeline in chunks and stitches them together again, so that the memory of the
+    # pipeline depends on the chunk size instead of the length of the text
+    docs = []
+
+    for doc in nlp.pipe(get_chunks(text, settings.NLP_CHUNK_SIZE), batch_size=settings.NLP_CHUNK_BATCH_SIZE):
+        # Only the annotations are needed for the extraction, not the activations of the transformer
+        doc.tensor = numpy.zeros((0, 0), dtype="float32")
+        doc.user_data.clear()
+        docs.append(doc)
+
+    if len(docs) == 1:
+        return docs[0]
+
+    # The chunks keep their trailing whitespace, so the token indices are the same as those of the whole text
+    return Doc.from_docs(docs, ensure_whitespace=False, exclude=["tensor", "user_data"])
+
+
+def get_chunks(text, size):
+    # Paragraphs are kept together if possible, longer ones are split between sentences
+    pieces = []
+
+    for paragraph in get_paragraphs(text):
+        if len(paragraph) <= size:
+            pieces.append(paragraph)
+        else:
+            boundaries = get_sentence_boundaries(paragraph) or [(0, len(paragraph))]
+            pieces.extend(paragraph[start:end] for start, end in boundaries)
+
+    chunks = []
+    chunk = []
+    length = 0
+
+    for piece in pieces:
+        if chunk and length + len(piece) > size:
+            chunks.append("".join(chunk))
+            chunk = []
+            length = 0
+
+        chunk.append(piece)
+        length += len(piece)
+
+    if chunk:
+        chunks.append("".join(chunk))
+
+    return chunks
+
+
+def get_paragraphs(text):
+    # Each paragraph includes the blank lines after it, so that the paragraphs add up to the text
+    paragraphs = []
+    start = 0
+
+    for match in paragraph_pattern.finditer(text):
+        paragraphs.append(text[start:match.end()])
+        start = match.end()
+
+    if start < len(text):
+        paragraphs.append(text[start:])
+
+    return paragraphs
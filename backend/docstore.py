@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+
+import spacy
+from spacy.tokens import DocBin
+
+from backend.cache import get_cache_key
+
+
+def get_model_name(meta):
+    return meta["lang"] + "_" + meta["name"] + "-" + meta["version"]
+
+
+def get_model_meta(model):
+    lang, name = model.split("_", 1)
+    name, version = name.rsplit("-", 1)
+
+    return {"lang": lang, "name": name, "version": version}
+
+
+class DocStore:
+    # Parsed documents by model and content hash, so that changed extraction rules can be run again without the
+    # pipeline. Each model version has its own directory, the documents of other versions are never mixed up.
+    def __init__(self, directory):
+        self.directory = directory
+        self.vocabs = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, model, text):
+        return get_cache_key(text, model)
+
+    def get_path(self, model, key):
+        return os.path.join(self.directory, model, key[:2], key + ".spacy")
+
+    def get(self, model, key):
+        if not self.directory:
+            return None
+
+        try:
+            with open(self.get_path(model, key), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        docs = list(DocBin().from_bytes(data).get_docs(self.get_vocab(model)))
+
+        return docs[0] if docs else None
+
+    def set(self, model, key, doc):
+        if not self.directory:
+            return
+
+        path = self.get_path(model, key)
+
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Only the annotations are stored, the rules do not need the tensors or the user data
+        doc_bin = DocBin(docs=[doc], store_user_data=False)
+
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path), delete=False) as file:
+            file.write(doc_bin.to_bytes())
+
+        os.replace(file.name, path)
+
+    def get_vocab(self, model):
+        # Documents are restored with the vocabulary of a blank pipeline, the model itself is not loaded
+        lang = get_model_meta(model)["lang"]
+
+        with self.lock:
+            if lang not in self.vocabs:
+                self.vocabs[lang] = spacy.blank(lang).vocab
+
+            return self.vocabs[lang]
+
+    def models(self, name=None):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+
+        return sorted(
+            model for model in os.listdir(self.directory)
+            if "_" in model and "-" in model and (name is None or model.rsplit("-", 1)[0] == name)
+        )
+
+    def keys(self, model):
+        directory = os.path.join(self.directory, model)
+
+        for prefix in sorted(os.listdir(directory)):
+            if not os.path.isdir(os.path.join(directory, prefix)):
+                continue
+
+            for file_name in sorted(os.listdir(os.path.join(directory, prefix))):
+                if file_name.endswith(".spacy"):
+                    yield file_name[:-6]
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from spacy.tokens import Doc
+
+from backend.cache import get_cache_key, normalize_text
+from backend.nlp import extract, get_result_key, result_cache
+from backend.pipeline import get_pipeline, get_sentence_boundaries
+from backend.records import encode
+
+
+class IncrementalSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sentences = {}
+        self.elements = []
+        self.version = None
+
+
+sessions = OrderedDict()
+sessions_lock = threading.Lock()
+
+
+def get_session(session_id):
+    with sessions_lock:
+        session = sessions.get(session_id)
+
+        if session is None:
+            session = IncrementalSession()
+            sessions[session_id] = session
+
+        sessions.move_to_end(session_id)
+
+        while len(sessions) > settings.NLP_INCREMENTAL_SESSIONS:
+            sessions.popitem(last=False)
+
+    return session
+
+
+def parse_incremental(text, session_id, base_version=None, tier=None):
+    text = normalize_text(text)
+    nlp = get_pipeline(tier)
+    session = get_session((session_id, tier))
+
+    with session.lock:
+        # Sentences parsed with their neighbours can differ from a parse of the whole text, so the incremental
+        # elements are cached apart from those of the other endpoints
+        key = get_cache_key(get_result_key(nlp, text), "incremental")
+        elements = result_cache.get(key)
+
+        if elements is None:
+            elements = extract(get_incremental_doc(nlp, session, text))
+            result_cache.set(key, elements)
+
+        version = get_version(elements)
+        result = {"version": version}
+
+        if base_version is not None and base_version == session.version:
+            result["base_version"] = base_version
+            result["delta"] = get_delta(session.elements, elements)
+        else:
+            result["elements"] = elements
+
+        session.elements = elements
+        session.version = version
+
+    return result
+
+
+def get_version(elements):
+    # The version identifies the elements themselves, so that a version the client got from another worker can only
+    # match a session with the same elements and the delta always applies to what the client has
+    return get_cache_key(encode(elements).decode("utf-8"))[:16]
+
+
+def get_incremental_doc(nlp, session, text):
+    # Every sentence is parsed together with its neighbouring sentences, so only the sentences within the context
+    # window of a changed sentence have to go through the pipeline again.
+    boundaries = get_sentence_boundaries(text)
+    context = settings.NLP_INCREMENTAL_CONTEXT
+
+    keys = []
+    sentences = {}
+    windows = {}
+
+    for index, (start, end) in enumerate(boundaries):
+        window_start = boundaries[max(0, index - context)][0]
+        window_end = boundaries[min(len(boundaries) - 1, index + context)][1]
+        key = get_cache_key(text[window_start:window_end], start - window_start, get_result_key(nlp, ""))
+        keys.append(key)
+
+        if key in session.sentences:
+            sentences[key] = session.sentences[key]
+        else:
+            windows[key] = (text[window_start:window_end], start - window_start, end - window_start)
+
+    window_docs = nlp.pipe(window_text for window_text, start, end in windows.values())
+
+    for (key, (window_text, start, end)), window_doc in zip(windows.items(), window_docs):
+        span = window_doc.char_span(start, end, alignment_mode="expand")
+
+        if span is not None:
+            sentences[key] = span.as_doc().to_bytes(exclude=["tensor", "user_data"])
+
+    if not keys:
+        return nlp.make_doc(text)
+
+    if len(sentences) == len(set(keys)):
+        doc = Doc.from_docs([Doc(nlp.vocab).from_bytes(sentences[key]) for key in keys], ensure_whitespace=False)
+
+        if doc.text == text:
+            session.sentences = sentences
+
+            return doc
+
+    # The pipeline split the text differently than the sentencizer, so the sentences cannot be stitched together
+    session.sentences = {}
+
+    return nlp(text)
+
+
+def get_delta(previous_elements, elements):
+    # The client patches its elements by identifier, so the elements are matched by identifier as well. Identifiers
+    # are token indices: text inserted before an element moves it and all elements after it, which then show up as
+    # changed, added or removed.
+    previous = {element.identifier: element for element in previous_elements}
+    current = {element.identifier: element for element in elements}
+
+    return {
+        "added": [element for element in elements if element.identifier not in previous],
+        "removed": [identifier for identifier in previous if identifier not in current],
+        "changed": [
+            element for element in elements
+            if element.identifier in previous and previous[element.identifier] != element
+        ]
+    }
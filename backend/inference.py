@@ -0,0 +1,55 @@
+from thinc.api import PyTorchShim
+
+inference_modes = ["default", "quantized"]
+
+
+def optimize_pipeline(nlp, mode):
+    # In the quantized mode, the linear layers of the transformer run with int8 weights and without autograd tracking.
+    # Pipelines without a PyTorch model are left as they are.
+    if mode not in inference_modes:
+        raise ValueError("Unknown inference mode: " + str(mode))
+
+    shims = get_torch_shims(nlp)
+
+    if mode == "default" or not shims:
+        return nlp
+
+    import torch
+
+    torch.set_flush_denormal(True)
+
+    for shim in shims:
+        shim._model = torch.ao.quantization.quantize_dynamic(shim._model, {torch.nn.Linear}, dtype=torch.qint8)
+        shim.predict = get_inference_predict(shim.predict)
+
+    # The results can differ slightly from those of the original weights, so they are cached and stored separately
+    nlp.meta["version"] = nlp.meta["version"] + "+int8"
+
+    return nlp
+
+
+def get_torch_shims(nlp):
+    shims = {}
+
+    for name, component in nlp.pipeline:
+        model = getattr(component, "model", None)
+
+        if model is None or not hasattr(model, "walk"):
+            continue
+
+        for node in model.walk():
+            for shim in node.shims:
+                if isinstance(shim, PyTorchShim):
+                    shims[id(shim)] = shim
+
+    return list(shims.values())
+
+
+def get_inference_predict(predict):
+    import torch
+
+    def inference_predict(inputs):
+        with torch.inference_mode():
+            return predict(inputs)
+
+    return inference_predict
@@ -0,0 +1,101 @@
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.models import Job
+from backend.records import decode_elements, encode
+
+worker_stopped = "The worker stopped while converting the process description."
+
+
+def submit_job(process_description, tier=None, priority=0):
+    return Job.objects.create(process_description=process_description, tier=tier or "", priority=priority)
+
+
+def get_job(job_id):
+    now = timezone.now()
+
+    return Job.objects.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now), id=job_id).first()
+
+
+def wait_for_job(job_id, timeout):
+    # Long polling: the job is returned as soon as it is finished or the timeout has passed
+    deadline = time.monotonic() + timeout
+
+    while True:
+        job = get_job(job_id)
+
+        if job is None or job.status in (Job.DONE, Job.FAILED) or time.monotonic() >= deadline:
+            return job
+
+        time.sleep(min(settings.NLP_JOB_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+
+def claim_job(worker):
+    # Only one worker can move a job from pending to running, so that every job is converted at most once
+    while True:
+        job_id = Job.objects.filter(status=Job.PENDING).order_by("-priority", "created_at").values_list(
+            "id", flat=True
+        ).first()
+
+        if job_id is None:
+            return None
+
+        claimed = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, worker=worker, started_at=timezone.now()
+        )
+
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+
+def run_job(job, worker):
+    from backend.nlp import parse
+
+    try:
+        result = encode(parse(job.process_description, job.tier or None))
+        changes = {"status": Job.DONE, "result": result}
+    except Exception as error:
+        changes = {"status": Job.FAILED, "error": str(error) or type(error).__name__}
+
+    finish_jobs(Job.objects.filter(id=job.id, status=Job.RUNNING, worker=worker), **changes)
+
+
+def fail_running_jobs(workers):
+    # Jobs of workers that stopped are failed instead of being converted again
+    return finish_jobs(Job.objects.filter(status=Job.RUNNING, worker__in=workers), status=Job.FAILED,
+                       error=worker_stopped)
+
+
+def finish_jobs(jobs, **changes):
+    now = timezone.now()
+
+    return jobs.update(finished_at=now, expires_at=now + timedelta(seconds=settings.NLP_JOB_EXPIRY), **changes)
+
+
+def delete_expired_jobs():
+    return Job.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def get_worker_name(pid=None):
+    return socket.gethostname() + ":" + str(pid or os.getpid())
+
+
+def get_job_dict(job):
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "priority": job.priority,
+        "tier": job.tier or None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+        "error": job.error or None,
+        "result": decode_elements(bytes(job.result)) if job.status == Job.DONE else None
+    }
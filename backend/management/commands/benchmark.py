@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+import spacy
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.management.commands.compare_tiers import percentile
+from backend.nlp import get_bpmn_elements, get_process_elements
+from backend.pipeline import get_model, load_pipeline
+from backend.records import encode
+from backend.synthetic import get_doc
+
+corpus_directory = os.path.join(settings.BASE_DIR, 'backend', 'benchmarks', 'corpus')
+
+
+class Command(BaseCommand):
+    help = 'Times every stage of the conversion on a fixed corpus and compares the results to a stored baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tier', default=None, help='Model tier to benchmark, the default tier if not set')
+        parser.add_argument('--stub', action='store_true',
+                            help='Replace the model by the annotated synthetic documents to benchmark only the rules')
+        parser.add_argument('--documents', default=None, help='Comma-separated names of the documents to run')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per document')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmark-baseline.json'),
+                            help='JSON file with the baseline results of this machine')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Relative slowdown of a median compared to the baseline that counts as a regression')
+        parser.add_argument('--min-time', type=float, default=0.5,
+                            help='Slowdowns below this many milliseconds are ignored as noise')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('The number of runs must be positive.')
+
+        version, documents = read_manifest()
+
+        if options['documents']:
+            names = options['documents'].split(',')
+            documents = [document for document in documents if document['name'] in names]
+
+        if options['stub']:
+            mode = 'stub'
+            documents = [document for document in documents if 'sentences' in document]
+            nlp = None
+            vocab = spacy.blank('en').vocab
+            load_time = 0.0
+        else:
+            try:
+                model = get_model(options['tier'])
+            except ValueError as error:
+                raise CommandError(error)
+
+            mode = options['tier'] or settings.NLP_MODEL_TIER
+            start = time.perf_counter()
+
+            try:
+                nlp = load_pipeline(model)
+            except OSError as error:
+                raise CommandError(error)
+
+            load_time = time.perf_counter() - start
+            vocab = nlp.vocab
+
+        if not documents:
+            raise CommandError('There are no documents to run.')
+
+        self.stdout.write('Corpus version %d, %s, model load %.2f s' % (version, mode, load_time))
+
+        results = {}
+
+        for document in documents:
+            text = document['text']
+
+            if nlp is None:
+                def parse():
+                    return get_doc(vocab, document['sentences'], document['seed'])
+
+                if parse().text != text:
+                    raise CommandError('The synthetic document ' + document['name'] + ' does not match the corpus.')
+            else:
+                def parse():
+                    return run_pipeline(nlp, text)
+
+            # The first run is not timed, it warms up the pipeline and the caches
+            tokens = run(parse)[1]
+            durations = {}
+
+            for _ in range(options['repeat']):
+                for stage, duration in run(parse)[0].items():
+                    durations.setdefault(stage, []).append(duration)
+
+            durations['total'] = [sum(stage_durations) for stage_durations in zip(*durations.values())]
+
+            # Tracing slows everything down, so memory is measured in a run of its own
+            tracemalloc.start()
+            run(parse)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[document['name']] = {
+                'tokens': tokens, 'peak_memory': peak,
+                'stages': {
+                    stage: {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+                    for stage, values in durations.items()
+                }
+            }
+
+        self.write_results(results)
+
+        baseline = read_baseline(options['baseline'])
+        regressions = []
+
+        if baseline.get('corpus_version') == version and mode in baseline.get('modes', {}):
+            regressions = self.compare(results, baseline['modes'][mode], options['threshold'], options['min_time'])
+        else:
+            self.stdout.write('There is no baseline for corpus version %d and %s.' % (version, mode))
+
+        if options['save_baseline']:
+            if baseline.get('corpus_version') != version:
+                baseline = {'corpus_version': version, 'modes': {}}
+
+            baseline['modes'][mode] = results
+
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(baseline, file, indent=4)
+
+            self.stdout.write('Stored the results as baseline in ' + options['baseline'] + '.')
+        elif regressions:
+            raise CommandError('%d stages are slower than the baseline.' % len(regressions))
+
+    def write_results(self, results):
+        self.stdout.write('%-14s %-18s %10s %10s %10s' % ('document', 'stage', 'p50 ms', 'p95 ms', 'runs/s'))
+
+        for name, result in results.items():
+            for stage, timing in result['stages'].items():
+                self.stdout.write('%-14s %-18s %10.2f %10.2f %10s' % (
+                    name, stage, timing['p50'] * 1000, timing['p95'] * 1000,
+                    '%.1f' % (1 / timing['p50']) if stage == 'total' and timing['p50'] else ''
+                ))
+
+            self.stdout.write('%-14s %d tokens, %.0f tokens/s, peak Python memory %.0f KB' % (
+                name, result['tokens'], result['tokens'] / result['stages']['total']['p50'],
+                result['peak_memory'] / 1024
+            ))
+
+        self.stdout.write('Peak resident memory of the process %.0f MB' % (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        ))
+
+    def compare(self, results, baseline, threshold, min_time):
+        regressions = []
+
+        for name, result in results.items():
+            for stage, timing in result['stages'].items():
+                previous = baseline.get(name, {}).get('stages', {}).get(stage)
+
+                if previous is None:
+                    continue
+
+                slowdown = timing['p50'] - previous['p50']
+
+                if slowdown * 1000 > min_time and timing['p50'] > previous['p50'] * (1 + threshold):
+                    regressions.append((name, stage))
+                    self.stdout.write(self.style.ERROR('%s %s: %.2f ms instead of %.2f ms (%+.0f%%)' % (
+                        name, stage, timing['p50'] * 1000, previous['p50'] * 1000, slowdown / previous['p50'] * 100
+                    )))
+
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No stage is slower than the baseline.'))
+
+        return regressions
+
+
+def read_manifest():
+    # The corpus is versioned, results of different versions are not compared
+    with open(os.path.join(corpus_directory, 'manifest.json'), encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    for document in manifest['documents']:
+        with open(os.path.join(corpus_directory, document['file']), 'rb') as file:
+            content = file.read()
+
+        if hashlib.sha256(content).hexdigest() != document['sha256']:
+            raise CommandError(
+                'The corpus file ' + document['file'] + ' changed, update its hash and increase the corpus version.'
+            )
+
+        document['text'] = content.decode('utf-8').strip()
+
+    return manifest['version'], manifest['documents']
+
+
+def read_baseline(path):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def run_pipeline(nlp, text):
+    # The same as calling the pipeline, but every component is timed on its own
+    timings = {}
+
+    start = time.perf_counter()
+    doc = nlp.make_doc(text)
+    timings['tokenizer'] = time.perf_counter() - start
+
+    for name, component in nlp.pipeline:
+        start = time.perf_counter()
+        doc = component(doc)
+        timings[name] = time.perf_counter() - start
+
+    doc.user_data['timings'] = timings
+
+    return doc
+
+
+def run(parse):
+    start = time.perf_counter()
+    doc = parse()
+    parse_time = time.perf_counter() - start
+
+    timings = doc.user_data.pop('timings', None) or {'stub parse': parse_time}
+
+    start = time.perf_counter()
+    process_elements = get_process_elements(doc)
+    timings['process elements'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bpmn_elements = get_bpmn_elements(doc, process_elements)
+    timings['bpmn elements'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode(bpmn_elements)
+    timings['json'] = time.perf_counter() - start
+
+    return timings, len(doc)
@@ -0,0 +1,70 @@
+import time
+import tracemalloc
+
+import spacy
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.bpmn import serialize_bpmn
+from backend.nlp import get_bpmn_elements, get_process_elements
+from backend.records import encode
+from backend.synthetic import get_doc
+
+
+class Command(BaseCommand):
+    help = 'Compares the throughput of the BPMN 2.0 XML export with the JSON response on synthetic process models.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000',
+                            help='Comma-separated numbers of sentences per process description')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per size and format')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated process descriptions')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('The sizes must be comma-separated integers.')
+
+        if min(sizes) < 2 or options['repeat'] < 1:
+            raise CommandError('Every size must be at least 2 and the number of runs positive.')
+
+        vocab = spacy.blank('en').vocab
+
+        self.stdout.write('%9s %6s %9s %10s %10s %12s %10s' % (
+            'elements', 'format', 'bytes', 'ms', 'MB/s', 'elements/s', 'peak KB'
+        ))
+
+        for size in sizes:
+            doc = get_doc(vocab, size, options['seed'])
+            elements = get_bpmn_elements(doc, get_process_elements(doc))
+
+            for name, export in [('json', export_json), ('bpmn', export_bpmn)]:
+                durations = []
+
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    length = export(elements)
+                    durations.append(time.perf_counter() - start)
+
+                # Memory is measured in a separate run, tracing slows the export down
+                tracemalloc.start()
+                export(elements)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                duration = min(durations)
+
+                self.stdout.write('%9d %6s %9d %10.1f %10.1f %12.0f %10.0f' % (
+                    len(elements), name, length, duration * 1000, length / duration / 1000000,
+                    len(elements) / duration, peak / 1024
+                ))
+
+
+def export_json(elements):
+    # The same encoding as the responses of the API
+    return len(encode(elements))
+
+
+def export_bpmn(elements):
+    # The chunks are consumed like a streaming response does, without joining them
+    return sum(len(chunk.encode()) for chunk in serialize_bpmn(elements))
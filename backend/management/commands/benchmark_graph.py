@@ -0,0 +1,55 @@
+import time
+
+import spacy
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.nlp import get_bpmn_elements, get_process_elements
+from backend.synthetic import get_doc
+
+
+class Command(BaseCommand):
+    help = 'Times the extraction rules and the BPMN graph builder on synthetic process descriptions of growing size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,5000,10000,20000',
+                            help='Comma-separated numbers of sentences per process description')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per size')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the generated process descriptions')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('The sizes must be comma-separated integers.')
+
+        if min(sizes) < 2 or options['repeat'] < 1:
+            raise CommandError('Every size must be at least 2 and the number of runs positive.')
+
+        # The documents are annotated by the generator, so no model is needed
+        vocab = spacy.blank('en').vocab
+
+        self.stdout.write('%9s %9s %9s %9s %10s %10s %12s' % (
+            'sentences', 'tokens', 'process', 'bpmn', 'rules ms', 'graph ms', 'graph us/el'
+        ))
+
+        for size in sizes:
+            rules_time = graph_time = None
+
+            for _ in range(options['repeat']):
+                # A new document every run, so that the dependency index and the process roles are not reused
+                doc = get_doc(vocab, size, options['seed'])
+
+                start = time.perf_counter()
+                process_elements = get_process_elements(doc)
+                middle = time.perf_counter()
+                bpmn_elements = get_bpmn_elements(doc, process_elements)
+                end = time.perf_counter()
+
+                # The fastest run is the least disturbed one
+                rules_time = min(rules_time or middle - start, middle - start)
+                graph_time = min(graph_time or end - middle, end - middle)
+
+            self.stdout.write('%9d %9d %9d %9d %10.1f %10.1f %12.2f' % (
+                size, len(doc), len(process_elements), len(bpmn_elements), rules_time * 1000, graph_time * 1000,
+                graph_time * 1000000 / max(1, len(bpmn_elements))
+            ))
@@ -0,0 +1,137 @@
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.nlp import extract
+from backend.pipeline import get_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Runs a corpus of process descriptions through several model tiers and compares latency and results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=[os.path.join(settings.BASE_DIR, 'static', 'examples')],
+                            help='Text files or directories of text files with one process description per file')
+        parser.add_argument('--tiers', default='sm,trf', help='Comma-separated tiers to compare')
+        parser.add_argument('--reference', default='trf', help='Tier whose results the other tiers are compared to')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per process description')
+
+    def handle(self, *args, **options):
+        tiers = options['tiers'].split(',')
+        reference = options['reference']
+
+        for tier in tiers + [reference]:
+            if tier not in settings.NLP_MODELS:
+                raise CommandError('Unknown model tier: ' + tier)
+
+        if reference not in tiers:
+            tiers.append(reference)
+
+        texts = read_corpus(options['paths'])
+
+        if not texts:
+            raise CommandError('The corpus is empty.')
+
+        results = {}
+
+        for tier in tiers:
+            start = time.perf_counter()
+            nlp = get_pipeline(tier)
+            load_time = time.perf_counter() - start
+
+            # The first run is not timed, it warms up the pipeline
+            elements = [extract(nlp(text)) for name, text in texts]
+            latencies = []
+
+            for _ in range(options['repeat']):
+                for name, text in texts:
+                    start = time.perf_counter()
+                    extract(nlp(text))
+                    latencies.append(time.perf_counter() - start)
+
+            results[tier] = (load_time, latencies, elements)
+
+        self.stdout.write('%-6s %8s %8s %8s %8s %10s %8s %8s %8s' % (
+            'tier', 'load s', 'p50 ms', 'p95 ms', 'docs/s', 'identical', 'added', 'removed', 'changed'
+        ))
+
+        for tier in tiers:
+            load_time, latencies, elements = results[tier]
+            identical = added = removed = changed = 0
+
+            for document_elements, reference_elements in zip(elements, results[reference][2]):
+                delta = get_content_delta(reference_elements, document_elements)
+
+                if not any(delta.values()):
+                    identical += 1
+
+                added += len(delta['added'])
+                removed += len(delta['removed'])
+                changed += len(delta['changed'])
+
+            self.stdout.write('%-6s %8.2f %8.1f %8.1f %8.2f %10s %8d %8d %8d' % (
+                tier, load_time, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                len(latencies) / sum(latencies), '%d/%d' % (identical, len(texts)), added, removed, changed
+            ))
+
+        self.stdout.write('Elements are compared to the results of the reference tier ' + reference + '.')
+
+
+def get_content_delta(reference_elements, elements):
+    # The tiers can take different tokens for the same element, so the elements are matched by their content instead
+    # of their identifier, and an element has changed if it follows other elements than in the reference
+    reference = get_contents(reference_elements)
+    current = get_contents(elements)
+
+    return {
+        'added': [content for content in current if content not in reference],
+        'removed': [content for content in reference if content not in current],
+        'changed': [content for content in current if content in reference and current[content] != reference[content]]
+    }
+
+
+def get_contents(elements):
+    # Elements with the same content are told apart by their order
+    counts = {}
+    keyed = []
+
+    for element in elements:
+        content = (element.category, element.value, element.actor)
+        counts[content] = counts.get(content, 0) + 1
+        keyed.append((content + (counts[content],), element))
+
+    identifiers = {element.identifier: content for content, element in keyed}
+
+    return {
+        content: sorted((
+            identifiers.get(predecessor) for predecessor in element.predecessors or [element.predecessor]
+            if predecessor is not None
+        ), key=str)
+        for content, element in keyed
+    }
+
+
+def read_corpus(paths):
+    texts = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.txt'))
+        else:
+            files = [path]
+
+        for file_path in files:
+            with open(file_path, encoding='utf-8') as file:
+                texts.append((file_path, file.read().strip()))
+
+    return texts
+
+
+def percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
@@ -0,0 +1,265 @@
+import gc
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.bpmn import serialize_bpmn
+from backend.cache import get_cache_key, normalize_text
+from backend.records import encode
+from backend.threads import configure_threads, get_cpu_count, get_thread_budget
+
+formats = ['json', 'bpmn']
+
+
+class Command(BaseCommand):
+    help = 'Converts a directory of process descriptions or a JSONL file into JSON and/or BPMN files in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Directory of text files or JSONL file with an "id" and a "text" per line')
+        parser.add_argument('output', help='Directory the converted files, the progress and the error log go to')
+        parser.add_argument('--format', default='json', help='Comma-separated output formats: json, bpmn')
+        parser.add_argument('--processes', type=int, default=get_cpu_count(), help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=settings.NLP_BATCH_SIZE,
+                            help='Number of process descriptions passed through the pipeline at once')
+        parser.add_argument('--tier', default=None, help='Model tier, the default tier if not set')
+
+    def handle(self, *args, **options):
+        output_formats = options['format'].split(',')
+
+        if any(output_format not in formats for output_format in output_formats):
+            raise CommandError('Unknown output format, use ' + ' or '.join(formats) + '.')
+
+        if options['processes'] < 1 or options['batch_size'] < 1:
+            raise CommandError('The number of processes and the batch size must be positive.')
+
+        tier = options['tier'] or settings.NLP_MODEL_TIER
+
+        if tier not in settings.NLP_MODELS:
+            raise CommandError('Unknown model tier: ' + tier)
+
+        if not os.path.exists(options['input']):
+            raise CommandError('The input ' + options['input'] + ' does not exist.')
+
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+
+        # Every converted description is logged with its content hash, so that an interrupted run can be resumed
+        done_path = os.path.join(output, 'done.log')
+        done = read_done(done_path)
+        total = count_inputs(options['input'])
+
+        self.stdout.write('Converting %d process descriptions with %d processes, %d already done.' % (
+            total, options['processes'], len(done)
+        ))
+
+        fork = hasattr(os, 'fork')
+
+        if fork:
+            # The pipeline is loaded before forking, so that all workers share the model weights copy-on-write
+            from backend.pipeline import get_pipeline
+            get_pipeline(tier)
+            gc.freeze()
+
+        converted = skipped = failed = 0
+        start = last_report = time.perf_counter()
+        context = multiprocessing.get_context('fork' if fork else 'spawn')
+        batches = get_batches(read_inputs(options['input']), tier, done, options['batch_size'])
+
+        # The pool reads the batches ahead, a few per process are enough to keep all of them busy
+        pending = threading.BoundedSemaphore(2 * options['processes'])
+        batches = limit(batches, pending)
+
+        with open(done_path, 'a', encoding='utf-8') as done_file, \
+                open(os.path.join(output, 'errors.log'), 'a', encoding='utf-8') as error_file, \
+                context.Pool(options['processes'], initializer=start_worker,
+                             initargs=(tier, get_thread_budget(options['processes']))) as pool:
+            for batch_skipped, results in pool.imap_unordered(convert_batch, batches):
+                skipped += batch_skipped
+
+                pending.release()
+
+                for names, key, elements, error in results:
+                    for name in names:
+                        if error is not None:
+                            error_file.write(json.dumps({'name': name, 'hash': key, 'error': error}) + '\n')
+                            failed += 1
+                            continue
+
+                        # The outputs are written first, so that a description is never logged as done without them
+                        write_outputs(output, name, elements, output_formats)
+                        done_file.write(key + '\t' + name + '\n')
+                        converted += 1
+
+                done_file.flush()
+                error_file.flush()
+
+                if time.perf_counter() - last_report >= 5:
+                    last_report = time.perf_counter()
+                    self.report(converted, skipped, failed, total, last_report - start)
+
+        self.report(converted, skipped, failed, total, time.perf_counter() - start)
+
+        if failed:
+            self.stdout.write(self.style.WARNING('%d process descriptions failed, see %s.' % (
+                failed, os.path.join(output, 'errors.log')
+            )))
+
+    def report(self, converted, skipped, failed, total, duration):
+        self.stdout.write('%d/%d done (%d converted, %d skipped, %d failed), %.1f documents/s' % (
+            converted + skipped + failed, total, converted, skipped, failed, converted / duration if duration else 0.0
+        ))
+
+
+def limit(batches, pending):
+    for batch in batches:
+        pending.acquire()
+        yield batch
+
+
+def read_done(path):
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, encoding='utf-8') as file:
+        return set(tuple(line.rstrip('\n').split('\t', 1)) for line in file if '\t' in line)
+
+
+def count_inputs(path):
+    if os.path.isdir(path):
+        return sum(1 for name in os.listdir(path) if name.endswith('.txt'))
+
+    with open(path, encoding='utf-8') as file:
+        return sum(1 for line in file if line.strip())
+
+
+def read_inputs(path):
+    # Yields the name and text of every process description without reading the whole corpus at once
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.txt'):
+                with open(os.path.join(path, name), encoding='utf-8') as file:
+                    yield name[:-4], file.read()
+
+        return
+
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+
+            if not isinstance(record, dict):
+                record = {}
+
+            yield str(record.get('id', number)), record.get('text')
+
+
+def get_batches(inputs, tier, done, batch_size):
+    # Batches of distinct texts, each with the names it was given, and the number of names that were already done
+    batch = {}
+    skipped = 0
+
+    for name, text in inputs:
+        name = re.sub(r'[^\w.\-]', '_', name)
+
+        if isinstance(text, str):
+            text = normalize_text(text)
+            key = get_cache_key(text, settings.NLP_MODELS[tier])
+        else:
+            # Invalid records are passed on as well, so that they end up in the error log
+            text = None
+            key = 'invalid:' + name
+
+        if (key, name) in done:
+            skipped += 1
+            continue
+
+        batch.setdefault(key, (text, []))[1].append(name)
+
+        if len(batch) >= batch_size:
+            yield skipped, batch
+            batch = {}
+            skipped = 0
+
+    if batch or skipped:
+        yield skipped, batch
+
+
+def start_worker(tier, threads):
+    import django
+    django.setup()
+
+    configure_threads(threads)
+
+    global worker_tier
+    worker_tier = tier
+
+    # Forked workers inherit the pipeline of the parent, spawned ones load it
+    from backend.pipeline import get_pipeline
+    get_pipeline(tier)
+
+
+worker_tier = None
+
+
+def convert_batch(arguments):
+    from backend.chunking import get_chunked_doc
+    from backend.nlp import extract, store_doc
+    from backend.pipeline import get_pipeline
+
+    skipped, batch = arguments
+    nlp = get_pipeline(worker_tier)
+    items = [(key, text, names) for key, (text, names) in batch.items() if text is not None]
+    results = [
+        (names, key, None, 'Process description must be a string.')
+        for key, (text, names) in batch.items() if text is None
+    ]
+
+    # Long process descriptions are parsed in chunks like in parse, the others together
+    keys = [key for key, text, names in items if len(text) <= settings.NLP_CHUNK_SIZE]
+
+    try:
+        batch_texts = (batch[key][0] for key in keys)
+        docs = dict(zip(keys, nlp.pipe(batch_texts, batch_size=len(keys) or 1)))
+    except Exception:
+        # A failing batch is run again per process description, so that only the failing one gets the error
+        docs = {}
+
+    for key, text, names in items:
+        try:
+            doc = docs.get(key)
+
+            if doc is None:
+                doc = get_chunked_doc(nlp, text) if len(text) > settings.NLP_CHUNK_SIZE else nlp(text)
+
+            store_doc(nlp, text, doc)
+            elements = extract(doc)
+            results.append((names, key, elements, None))
+        except Exception as error:
+            results.append((names, key, None, str(error) or type(error).__name__))
+
+    return skipped, results
+
+
+def write_outputs(output, name, elements, output_formats):
+    for output_format in output_formats:
+        path = os.path.join(output, name + '.' + output_format)
+
+        with open(path + '.tmp', 'wb') as file:
+            if output_format == 'json':
+                file.write(encode(elements))
+            else:
+                for chunk in serialize_bpmn(elements):
+                    file.write(chunk.encode('utf-8'))
+
+        os.replace(path + '.tmp', path)
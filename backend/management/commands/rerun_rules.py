@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.docstore import get_model_meta
+from backend.nlp import doc_store, extract, get_rules_key, result_cache
+from backend.records import encode
+from backend.threads import get_cpu_count
+
+
+class Command(BaseCommand):
+    help = 'Runs the current extraction rules on the stored parsed documents of a model without the pipeline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tier', default=None,
+                            help='Model tier whose documents are used, the default tier if not set')
+        parser.add_argument('--output', default=None,
+                            help='Directory the JSON results go to, named by the content hash of the document')
+        parser.add_argument('--cache', action='store_true',
+                            help='Store the results in the on-disk result cache for the current rules')
+        parser.add_argument('--processes', type=int, default=get_cpu_count(), help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=256, help='Number of documents per task of a worker')
+
+    def handle(self, *args, **options):
+        if not settings.NLP_DOC_STORE_DIR:
+            raise CommandError('The document store is disabled, set NLP_DOC_STORE_DIR.')
+
+        if options['cache'] and not settings.NLP_CACHE_DIR:
+            raise CommandError('The on-disk result cache is disabled, set NLP_CACHE_DIR.')
+
+        if options['processes'] < 1 or options['batch_size'] < 1:
+            raise CommandError('The number of processes and the batch size must be positive.')
+
+        tier = options['tier'] or settings.NLP_MODEL_TIER
+
+        if tier not in settings.NLP_MODELS:
+            raise CommandError('Unknown model tier: ' + tier)
+
+        models = doc_store.models(settings.NLP_MODELS[tier])
+
+        if not models:
+            raise CommandError('There are no stored documents of ' + settings.NLP_MODELS[tier] + '.')
+
+        if options['output']:
+            os.makedirs(options['output'], exist_ok=True)
+
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+
+        with context.Pool(options['processes'], initializer=start_worker) as pool:
+            for model in models:
+                self.rerun(pool, model, options)
+
+    def rerun(self, pool, model, options):
+        documents = elements = changed = failed = 0
+        start = time.perf_counter()
+        tasks = ((model, keys, options['cache']) for keys in get_batches(doc_store.keys(model), options['batch_size']))
+
+        for results in pool.imap_unordered(rerun_batch, tasks):
+            for key, data, count, error in results:
+                documents += 1
+
+                if error is not None:
+                    self.stderr.write(key + ': ' + error)
+                    failed += 1
+                    continue
+
+                elements += count
+
+                if options['output'] and write_output(options['output'], key, data):
+                    changed += 1
+
+        duration = time.perf_counter() - start
+
+        self.stdout.write('%s: %d documents (%d failed), %d elements, %.1f s, %.0f documents/s' % (
+            model, documents, failed, elements, duration, documents / duration if duration else 0.0
+        ))
+
+        if options['output']:
+            self.stdout.write('%d results differ from the previous ones in %s.' % (changed, options['output']))
+
+
+def get_batches(keys, batch_size):
+    batch = []
+
+    for key in keys:
+        batch.append(key)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def start_worker():
+    import django
+    django.setup()
+
+
+def rerun_batch(arguments):
+    model, keys, cache = arguments
+    results = []
+
+    for key in keys:
+        try:
+            doc = doc_store.get(model, key)
+            elements = extract(doc)
+
+            if cache:
+                result_cache.set(get_rules_key(get_model_meta(model), doc.text), elements)
+
+            results.append((key, encode(elements), len(elements), None))
+        except Exception as error:
+            results.append((key, None, 0, str(error) or type(error).__name__))
+
+    return results
+
+
+def write_output(output, key, data):
+    # Returns whether the result is new or differs from the result of the previous run
+    path = os.path.join(output, key + '.json')
+
+    try:
+        with open(path, 'rb') as file:
+            if file.read() == data:
+                return False
+    except OSError:
+        pass
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(data)
+
+    os.replace(path + '.tmp', path)
+
+    return True
@@ -0,0 +1,130 @@
+import gc
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from backend import readiness
+from backend.jobs import claim_job, delete_expired_jobs, fail_running_jobs, get_worker_name, run_job
+from backend.models import Job
+from backend.threads import configure_threads, get_cpu_count, get_thread_budget
+
+
+class Command(BaseCommand):
+    help = 'Runs the jobs of the asynchronous API in a pool of worker processes that keep the pipelines loaded.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=max(1, get_cpu_count() // 2),
+                            help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('The number of processes must be positive.')
+
+        fork = hasattr(os, 'fork')
+
+        if fork:
+            # The pipelines are loaded before forking, so that all workers share the model weights copy-on-write
+            load_pipelines()
+            gc.freeze()
+
+        # Jobs still running on this host were claimed by workers of a previous pool that did not stop cleanly
+        failed = fail_running_jobs(get_host_workers())
+
+        if failed:
+            self.stderr.write('%d jobs of stopped workers failed.' % failed)
+
+        context = multiprocessing.get_context('fork' if fork else 'spawn')
+        threads = get_thread_budget(options['processes'])
+        processes = []
+        last_cleanup = 0.0
+
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write('Running jobs with %d processes.' % options['processes'])
+
+        try:
+            while True:
+                for slot in range(options['processes']):
+                    if slot < len(processes) and processes[slot].is_alive():
+                        continue
+
+                    if slot < len(processes):
+                        self.stderr.write('Worker %d stopped with exit code %s.' % (
+                            processes[slot].pid, processes[slot].exitcode
+                        ))
+                        fail_running_jobs([get_worker_name(processes[slot].pid)])
+
+                    # The forked worker must not share the database connection that the queries of the pool reopen
+                    connections.close_all()
+                    process = context.Process(target=run_worker, args=(threads,), name='job-worker', daemon=True)
+                    process.start()
+
+                    if slot < len(processes):
+                        processes[slot] = process
+                    else:
+                        processes.append(process)
+
+                if time.monotonic() - last_cleanup >= 60:
+                    last_cleanup = time.monotonic()
+                    delete_expired_jobs()
+
+                time.sleep(1)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+
+            for process in processes:
+                process.join()
+
+            fail_running_jobs([get_worker_name(process.pid) for process in processes])
+
+
+def stop(signum, frame):
+    raise SystemExit()
+
+
+def get_host_workers():
+    host = get_worker_name().rsplit(':', 1)[0]
+
+    return [
+        worker for worker in Job.objects.filter(status=Job.RUNNING).values_list('worker', flat=True).distinct()
+        if worker.rsplit(':', 1)[0] == host
+    ]
+
+
+def load_pipelines():
+    # Forked workers inherit the pipelines of the pool
+    if not readiness.loaded.is_set():
+        readiness.warm_up()
+
+
+def run_worker(threads):
+    import django
+    django.setup()
+
+    # The worker opens its own database connection instead of using one inherited from the pool
+    connections.close_all()
+
+    # The pool stops its workers itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_threads(threads)
+    load_pipelines()
+
+    worker = get_worker_name()
+
+    while True:
+        job = claim_job(worker)
+
+        if job is None:
+            time.sleep(settings.NLP_JOB_POLL_INTERVAL)
+            continue
+
+        run_job(job, worker)
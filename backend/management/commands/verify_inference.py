@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.incremental import get_delta
+from backend.inference import inference_modes
+from backend.management.commands.compare_tiers import percentile, read_corpus
+from backend.nlp import extract
+from backend.pipeline import get_model, load_pipeline
+from backend.threads import configure_threads, get_thread_budget
+
+
+class Command(BaseCommand):
+    help = 'Checks that an inference mode extracts the same BPMN elements as the default mode and compares their speed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            default=[os.path.join(settings.BASE_DIR, 'backend', 'benchmarks', 'corpus')],
+                            help='Text files or directories of text files with one process description per file')
+        parser.add_argument('--tier', default=None, help='Model tier to check, the default tier if not set')
+        parser.add_argument('--mode', default='quantized', help='Inference mode compared to the default mode')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per process description')
+
+    def handle(self, *args, **options):
+        if options['mode'] not in inference_modes:
+            raise CommandError('Unknown inference mode, use ' + ' or '.join(inference_modes) + '.')
+
+        if options['repeat'] < 1:
+            raise CommandError('The number of runs must be positive.')
+
+        try:
+            model = get_model(options['tier'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        texts = read_corpus(options['paths'])
+
+        if not texts:
+            raise CommandError('The corpus is empty.')
+
+        # The same threads as a single worker of the server
+        configure_threads(get_thread_budget(1))
+
+        results = {}
+
+        for mode in ['default', options['mode']]:
+            nlp = load_pipeline(model, mode)
+
+            # The first run is not timed, it warms up the pipeline
+            elements = [extract(nlp(text)) for name, text in texts]
+            latencies = []
+
+            for _ in range(options['repeat']):
+                for name, text in texts:
+                    start = time.perf_counter()
+                    extract(nlp(text))
+                    latencies.append(time.perf_counter() - start)
+
+            results[mode] = (latencies, elements)
+
+        self.stdout.write('%-10s %8s %8s %8s' % ('mode', 'p50 ms', 'p95 ms', 'docs/s'))
+
+        for mode, (latencies, elements) in results.items():
+            self.stdout.write('%-10s %8.1f %8.1f %8.2f' % (
+                mode, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                len(latencies) / sum(latencies)
+            ))
+
+        speedup = sum(results['default'][0]) / sum(results[options['mode']][0])
+        self.stdout.write('Speedup of %s: %.2fx' % (options['mode'], speedup))
+
+        differences = 0
+
+        for (name, text), reference_elements, document_elements in zip(
+                texts, results['default'][1], results[options['mode']][1]):
+            delta = get_delta(reference_elements, document_elements)
+
+            if any(delta.values()):
+                differences += 1
+                self.stdout.write('%s: %d added, %d removed, %d changed elements' % (
+                    name, len(delta['added']), len(delta['removed']), len(delta['changed'])
+                ))
+
+        if differences:
+            raise CommandError('%d of %d process descriptions have different elements in the %s mode.' % (
+                differences, len(texts), options['mode']
+            ))
+
+        self.stdout.write(self.style.SUCCESS('The elements of all %d process descriptions are the same.' % len(texts)))
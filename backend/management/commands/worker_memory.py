@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Shows the resident (RSS), proportional (PSS) and shared memory of the gunicorn master and its workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='gunicorn', help='Part of the command line of the processes to show')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir('/proc'):
+            raise CommandError('The memory usage can only be read from /proc on Linux.')
+
+        processes = []
+
+        for pid in sorted((int(entry) for entry in os.listdir('/proc') if entry.isdigit())):
+            try:
+                with open('/proc/%d/cmdline' % pid, 'rb') as file:
+                    command = file.read().replace(b'\0', b' ').decode(errors='replace').strip()
+
+                if options['name'] not in command or pid == os.getpid():
+                    continue
+
+                with open('/proc/%d/stat' % pid) as file:
+                    parent = int(file.read().rsplit(')', 1)[1].split()[1])
+
+                processes.append((pid, parent, read_memory(pid), command))
+            except (OSError, ValueError, IndexError):
+                continue
+
+        if not processes:
+            raise CommandError('No process matches ' + options['name'] + '.')
+
+        self.stdout.write('%8s %8s %10s %10s %10s  %s' % ('pid', 'ppid', 'rss MB', 'pss MB', 'shared MB', 'command'))
+
+        for pid, parent, memory, command in processes:
+            self.stdout.write('%8d %8d %10.1f %10.1f %10.1f  %s' % (
+                pid, parent, memory.get('Rss', 0) / 1024, memory.get('Pss', 0) / 1024,
+                (memory.get('Shared_Clean', 0) + memory.get('Shared_Dirty', 0)) / 1024, command[:60]
+            ))
+
+        self.stdout.write('Total PSS: %.1f MB' % (sum(memory.get('Pss', 0) for pid, parent, memory, command in processes) / 1024))
+
+
+def read_memory(pid):
+    memory = {}
+
+    with open('/proc/%d/smaps_rollup' % pid) as file:
+        for line in file:
+            parts = line.split()
+
+            if len(parts) == 3 and parts[2] == 'kB':
+                memory[parts[0].rstrip(':')] = int(parts[1])
+
+    return memory
@@ -0,0 +1,333 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+size_buckets = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000]
+
+lock = threading.Lock()
+writer_pid = None
+changes = 0
+
+
+class Metric:
+    def __init__(self, kind, name, description, labels=()):
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+
+        registry.append(self)
+
+    def render(self, values):
+        lines = ["# HELP " + self.name + " " + self.description, "# TYPE " + self.name + " " + self.kind]
+
+        for label_values, value in sorted(values.items()):
+            lines.append(self.name + get_labels(self.labels, label_values) + " " + format_value(value))
+
+        return lines
+
+
+class Counter(Metric):
+    def __init__(self, name, description, labels=()):
+        super().__init__("counter", name, description, labels)
+
+    def inc(self, *label_values, amount=1):
+        global changes
+
+        with lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+            changes += 1
+
+
+class Gauge(Metric):
+    def __init__(self, name, description, labels=()):
+        super().__init__("gauge", name, description, labels)
+
+    def add(self, amount, *label_values):
+        global changes
+
+        with lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+            changes += 1
+
+
+class Histogram(Metric):
+    def __init__(self, name, description, buckets, labels=()):
+        super().__init__("histogram", name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        global changes
+
+        with lock:
+            changes += 1
+            counts = self.values.get(label_values)
+
+            if counts is None:
+                # A count per bucket, then the sum and the count of all values
+                counts = [0] * (len(self.buckets) + 2)
+                self.values[label_values] = counts
+
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[index] += 1
+
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self, values):
+        lines = ["# HELP " + self.name + " " + self.description, "# TYPE " + self.name + " histogram"]
+
+        for label_values, counts in sorted(values.items()):
+            for bucket, count in zip(self.buckets + ["+Inf"], counts[:len(self.buckets)] + [counts[-1]]):
+                labels = get_labels(self.labels + ("le",), label_values + (format_value(bucket),))
+                lines.append(self.name + "_bucket" + labels + " " + str(count))
+
+            lines.append(self.name + "_sum" + get_labels(self.labels, label_values) + " " + format_value(counts[-2]))
+            lines.append(self.name + "_count" + get_labels(self.labels, label_values) + " " + str(counts[-1]))
+
+        return lines
+
+
+registry = []
+
+requests_total = Counter("timo_requests_total", "Requests by endpoint and status code.", ("endpoint", "status"))
+requests_in_flight = Gauge("timo_requests_in_flight", "Requests being processed.", ("endpoint",))
+request_seconds = Histogram(
+    "timo_request_duration_seconds", "Duration of the requests by endpoint.", latency_buckets, ("endpoint",)
+)
+stage_seconds = Histogram(
+    "timo_stage_duration_seconds", "Duration of the stages of a conversion.", latency_buckets, ("stage",)
+)
+document_tokens = Histogram("timo_document_tokens", "Tokens per converted process description.", size_buckets)
+document_sentences = Histogram("timo_document_sentences", "Sentences per converted process description.", size_buckets)
+elements_produced = Histogram("timo_elements", "BPMN elements per converted process description.", size_buckets)
+cascade_total = Counter(
+    "timo_cascade_total", "Conversions of the cascade mode by path, fast or the reason of the escalation.", ("path",)
+)
+admission_total = Counter(
+    "timo_admission_total", "Requests by admission decision, admitted or the reason of the rejection.", ("decision",)
+)
+
+
+class Timings:
+    # Durations of the stages of one request, for the Server-Timing header and the histograms
+    def __init__(self):
+        self.stages = {}
+        self.cache = None
+        self.cascade = None
+        self.admission = None
+        self.tokens = None
+        self.sentences = None
+        self.elements = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def set_doc(self, doc):
+        self.tokens = len(doc)
+        self.sentences = sum(1 for sent in doc.sents) if doc.has_annotation("SENT_START") else None
+
+    def get_header(self):
+        entries = ["%s;dur=%.1f" % (name, duration * 1000) for name, duration in self.stages.items()]
+
+        if self.cache:
+            entries.append("cache;desc=" + self.cache)
+
+        if self.cascade:
+            entries.append("cascade;desc=" + self.cascade)
+
+        return ", ".join(entries)
+
+
+def measure(endpoint):
+    # Adds the Server-Timing header to the responses of a view and, if enabled, collects its metrics
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.timings = Timings()
+
+            if settings.METRICS_ENABLED:
+                start_writer()
+                requests_in_flight.add(1, endpoint)
+
+            try:
+                with request.timings.stage("total"):
+                    response = view(request, *args, **kwargs)
+            finally:
+                if settings.METRICS_ENABLED:
+                    requests_in_flight.add(-1, endpoint)
+
+            response["Server-Timing"] = request.timings.get_header()
+
+            if settings.METRICS_ENABLED:
+                record(endpoint, response.status_code, request.timings)
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def record(endpoint, status, timings):
+    requests_total.inc(endpoint, str(status))
+    request_seconds.observe(timings.stages["total"], endpoint)
+
+    for stage, duration in timings.stages.items():
+        if stage != "total":
+            stage_seconds.observe(duration, stage)
+
+    if timings.tokens is not None:
+        document_tokens.observe(timings.tokens)
+
+    if timings.sentences is not None:
+        document_sentences.observe(timings.sentences)
+
+    if timings.elements is not None:
+        elements_produced.observe(timings.elements)
+
+    if timings.cascade is not None:
+        cascade_total.inc(timings.cascade)
+
+    if timings.admission is not None:
+        admission_total.inc(timings.admission)
+
+
+def render():
+    if settings.METRICS_DIR:
+        write_values()
+        values = read_values()
+    else:
+        with lock:
+            values = {metric.name: dict(metric.values) for metric in registry}
+
+    lines = []
+
+    for metric in registry:
+        lines.extend(metric.render(values.get(metric.name, {})))
+
+    return "\n".join(lines) + "\n"
+
+
+def start_writer():
+    # Every worker process writes its metrics to METRICS_DIR, so that /metrics returns the sum over all workers
+    # whichever worker answers the scrape. The thread does not survive a fork, so every worker starts its own.
+    global writer_pid
+
+    if not settings.METRICS_DIR or writer_pid == os.getpid():
+        return
+
+    with lock:
+        if writer_pid == os.getpid():
+            return
+
+        writer_pid = os.getpid()
+
+    threading.Thread(target=run_writer, name="metrics-writer", daemon=True).start()
+
+
+def run_writer():
+    written = None
+
+    while True:
+        if changes != written:
+            written = changes
+            write_values()
+
+        time.sleep(1)
+
+
+def write_values():
+    with lock:
+        values = {
+            metric.name: [[list(label_values), list(value) if isinstance(value, list) else value]
+                          for label_values, value in metric.values.items()]
+            for metric in registry
+        }
+
+    path = os.path.join(settings.METRICS_DIR, str(os.getpid()) + ".json")
+
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(values, file)
+
+    os.replace(path + ".tmp", path)
+
+
+def read_values():
+    # Counters and histograms of stopped workers still count, gauges only those of running workers
+    kinds = {metric.name: metric.kind for metric in registry}
+    values = {}
+
+    for name in os.listdir(settings.METRICS_DIR):
+        if not name.endswith(".json"):
+            continue
+
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name), encoding="utf-8") as file:
+                process_values = json.load(file)
+        except (OSError, ValueError):
+            continue
+
+        running = is_running(int(name[:-5]))
+
+        for metric_name, items in process_values.items():
+            if kinds.get(metric_name) == "gauge" and not running:
+                continue
+
+            metric_values = values.setdefault(metric_name, {})
+
+            for label_values, value in items:
+                label_values = tuple(label_values)
+                previous = metric_values.get(label_values)
+
+                if previous is None:
+                    metric_values[label_values] = value
+                elif isinstance(value, list):
+                    metric_values[label_values] = [a + b for a, b in zip(previous, value)]
+                else:
+                    metric_values[label_values] = previous + value
+
+    return values
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def get_labels(names, values):
+    if not names:
+        return ""
+
+    return "{" + ",".join('%s="%s"' % (name, escape(str(value))) for name, value in zip(names, values)) + "}"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
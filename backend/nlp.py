@@ -1,7 +1,29 @@
-import spacy
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
 import lemminflect
-from spacy import displacy
-from pathlib import Path
+from spacy.language import Language
+from spacy.matcher import Matcher
+from spacy.util import get_package_version
+
+from django.conf import settings
+
+from backend.batching import get_micro_batcher
+from backend.cache import ResultCache, get_cache_key, normalize_text
+from backend.chunking import get_chunked_doc
+from backend.docstore import DocStore, get_model_meta, get_model_name
+from backend.metrics import Timings
+from backend.pipeline import get_pipeline, get_warm_up_text
+from backend.records import BpmnElement, ProcessElement, decode_elements, encode
+
+# Increase whenever the extraction rules change, so that cached results of older rules are not served anymore
+RULES_VERSION = 2
+
+result_cache = ResultCache(settings.NLP_CACHE_SIZE, settings.NLP_CACHE_DIR, encode, decode_elements)
+
+doc_store = DocStore(settings.NLP_DOC_STORE_DIR)
 
 split_exclusive_gateway_indicators = [
     "for the case", "if", "in case", "in the case"
@@ -51,18 +73,249 @@ stopwords = [
 ]
 
 
-def parse(text):
-    nlp = spacy.load("en_core_web_trf")
-    nlp.add_pipe("merge_noun_chunks")
+def parse(text, tier=None, timings=None):
+    if timings is None:
+        timings = Timings()
+
+    text = normalize_text(text)
+
+    with timings.stage("wait"):
+        nlp = get_pipeline(tier)
+        fast_nlp = get_cascade_pipeline(nlp)
+
+    key = get_result_key(nlp, text)
+
+    if fast_nlp is not None:
+        key = get_cache_key(key, "cascade", get_model_name(fast_nlp.meta))
+
+    def compute():
+        timings.cache = "miss"
+
+        if fast_nlp is not None:
+            elements = parse_fast(fast_nlp, text, timings)
+
+            if elements is not None:
+                return elements
+
+        with timings.stage("nlp"):
+            doc = get_doc(text, tier)
+
+        timings.set_doc(doc)
+        store_doc(nlp, text, doc)
+
+        return extract(doc, timings)
+
+    timings.cache = "hit"
+    elements = result_cache.get_or_compute(key, compute)
+    timings.elements = len(elements)
+
+    return elements
+
+
+def get_cascade_pipeline(nlp):
+    # The fast pipeline of the cascade mode, None if the requested pipeline is the fast one or the mode is disabled
+    if not settings.NLP_CASCADE:
+        return None
+
+    fast_nlp = get_pipeline(settings.NLP_CASCADE_TIER)
+
+    return fast_nlp if fast_nlp is not nlp else None
+
+
+def parse_fast(fast_nlp, text, timings):
+    # The elements of the fast pipeline, or None if the text has to be parsed by the requested pipeline
+    with timings.stage("fast_nlp"):
+        doc = get_doc(text, settings.NLP_CASCADE_TIER)
+        elements, reason = extract_with_confidence(doc)
+
+    timings.cascade = reason or "fast"
+
+    if reason is not None:
+        return None
+
+    timings.set_doc(doc)
+    store_doc(fast_nlp, text, doc)
+
+    return elements
+
+
+def parse_batch(texts, batch_size=None, tier=None):
+    nlp = get_pipeline(tier)
+
+    results = [None] * len(texts)
+    pending = {}
+
+    for index, text in enumerate(texts):
+        if not isinstance(text, str):
+            results[index] = {"error": "Process description must be a string."}
+            continue
+
+        text = normalize_text(text)
+        key = get_result_key(nlp, text)
+
+        if key in pending:
+            pending[key][1].append(index)
+            continue
+
+        elements = result_cache.get(key)
+
+        if elements is None:
+            pending[key] = (text, [index])
+        else:
+            results[index] = {"elements": elements}
+
+    # Long process descriptions are parsed in chunks like in parse, the others together
+    keys = [key for key, (text, indices) in pending.items() if len(text) <= settings.NLP_CHUNK_SIZE]
+
+    try:
+        batch_texts = (pending[key][0] for key in keys)
+        docs = dict(zip(keys, nlp.pipe(batch_texts, batch_size=batch_size or settings.NLP_BATCH_SIZE)))
+    except Exception:
+        # A failing batch is run again per process description, so that only the failing one gets the error
+        docs = {}
+
+    for key, (text, indices) in pending.items():
+        try:
+            doc = docs.get(key)
+
+            if doc is None:
+                doc = get_chunked_doc(nlp, text) if len(text) > settings.NLP_CHUNK_SIZE else nlp(text)
+
+            store_doc(nlp, text, doc)
+            elements = extract(doc)
+            result_cache.set(key, elements)
+            result = {"elements": elements}
+        except Exception as error:
+            result = {"error": str(error) or type(error).__name__}
+
+        for index in indices:
+            results[index] = result
+
+    return results
+
+
+def get_doc(text, tier=None):
+    if len(text) > settings.NLP_CHUNK_SIZE:
+        return get_chunked_doc(get_pipeline(tier), text)
+
+    if settings.NLP_MICRO_BATCHING:
+        return get_micro_batcher(tier).submit(text)
+
+    return get_pipeline(tier)(text)
+
+
+def extract(doc, timings=None):
+    if timings is None:
+        return get_bpmn_elements(doc, get_process_elements(doc))
+
+    with timings.stage("extraction"):
+        process_elements = get_process_elements(doc)
+
+    with timings.stage("graph"):
+        return get_bpmn_elements(doc, process_elements)
+
+
+def rerun_rules(text, tier=None):
+    # Runs the current rules on the stored document of a text without the pipeline, None if it was never stored
+    model = get_stored_model(tier)
+
+    if model is None:
+        return None
+
+    doc = doc_store.get(model, doc_store.get_key(model, normalize_text(text)))
+
+    if doc is None:
+        return None
+
+    return extract(doc)
+
 
-    doc = nlp(text)
+def get_stored_model(tier=None):
+    # The model version the pipeline of the tier would have, read from the installed package instead of loading it.
+    # Without the package, the newest version in the document store is used.
+    name = settings.NLP_MODELS[tier or settings.NLP_MODEL_TIER]
+    models = doc_store.models(name)
+    version = get_package_version(name)
 
-    return get_bpmn_elements(doc, get_process_elements(doc))
+    if version is None:
+        return max(models, key=get_version_key, default=None)
 
+    # Quantized pipelines store their documents apart, but only transformer pipelines are quantized
+    model = name + "-" + version
 
-def get_process_elements(doc):
+    if settings.NLP_INFERENCE == "quantized" and model + "+int8" in models:
+        return model + "+int8"
+
+    return model
+
+
+def get_version_key(model):
+    return [int(part) if part.isdigit() else 0 for part in re.split(r"[.+]", get_model_meta(model)["version"])]
+
+
+def store_doc(nlp, text, doc):
+    model = get_model_name(nlp.meta)
+    doc_store.set(model, doc_store.get_key(model, text), doc)
+
+
+def get_result_key(nlp, text):
+    return get_rules_key(nlp.meta, text)
+
+
+def get_rules_key(meta, text):
+    return get_cache_key(text, meta["lang"], meta["name"], meta["version"], RULES_VERSION)
+
+
+def warm_up():
+    text = get_warm_up_text()
+    tiers = list(settings.NLP_PRELOAD_TIERS)
+
+    if settings.NLP_CASCADE and settings.NLP_CASCADE_TIER not in tiers:
+        tiers.insert(0, settings.NLP_CASCADE_TIER)
+
+    for tier in tiers:
+        if text:
+            parse(text, tier)
+        else:
+            get_pipeline(tier)
+
+
+def extract_with_confidence(doc):
+    # The elements of a document and the reason why they cannot be trusted, None if they can: verbs without a business
+    # object and gateways that are never opened or closed usually come from a wrong parse
+    skipped_verbs = []
+
+    try:
+        process_elements = get_process_elements(doc, skipped_verbs)
+
+        if not process_elements:
+            return None, "no_elements"
+
+        if skipped_verbs:
+            return None, "verb_without_object"
+
+        builder = build_graph(doc, process_elements)
+    except Exception:
+        return None, "error"
+
+    if builder.unresolved:
+        return None, "unresolved_gateway"
+
+    return builder.get_elements(), None
+
+
+def get_process_elements(doc, skipped_verbs=None):
     elements = []
+    add_process_elements(doc, elements, skipped_verbs)
+
+    if len(elements) > 0:
+        elements[0].category = "start_event"
+
+    return elements
+
 
+def add_process_elements(doc, elements, skipped_verbs=None, offset=0):
+    # A split parallel gateway goes before the last element, all the others are only appended
     for sent in doc.sents:
         verbs = [token for token in sent if token.pos_ == "VERB"]
 
@@ -71,37 +324,37 @@ def get_process_elements(doc):
 
             if split_exclusive_gateway:
                 if split_exclusive_gateway == verb:
-                    elements.append({"category": "split_exclusive_gateway", "verb": verb})
+                    elements.append(ProcessElement("split_exclusive_gateway", verb.i, offset))
 
                 continue
 
             split_parallel_gateway = detect_split_parallel_gateway(verb)
 
             if split_parallel_gateway:
-                elements.insert(len(elements) - 1, {"category": "split_parallel_gateway", "verb": verb})
-                elements.append({"category": "sequence_flow_change", "verb": verb})
+                elements.insert(len(elements) - 1, ProcessElement("split_parallel_gateway", verb.i, offset))
+                elements.append(ProcessElement("sequence_flow_change", verb.i, offset))
 
             sequence_flow_change = detect_sequence_flow_change(verb)
 
             if sequence_flow_change:
-                elements.append({"category": "sequence_flow_change", "verb": verb})
+                elements.append(ProcessElement("sequence_flow_change", verb.i, offset))
 
             join_gateway = detect_join_gateway(doc, verb)
 
             if join_gateway:
-                elements.append({"category": "join_gateway", "verb": verb})
+                elements.append(ProcessElement("join_gateway", verb.i, offset))
                 continue
 
             end_event = detect_end_event(verb)
 
             if end_event:
-                elements.append({"category": "end_event", "verb": verb})
+                elements.append(ProcessElement("end_event", verb.i, offset))
                 continue
 
             intermediate_event = detect_intermediate_event(verb)
 
             if intermediate_event:
-                elements.append({"category": "intermediate_event", "verb": verb})
+                elements.append(ProcessElement("intermediate_event", verb.i, offset))
                 continue
 
             if has_children_verbs(verb):
@@ -110,316 +363,611 @@ def get_process_elements(doc):
             business_object = get_business_object(verb)
 
             if business_object:
-                elements.append({"category": "task", "verb": verb})
+                elements.append(ProcessElement("task", verb.i, offset))
                 continue
 
-    if len(elements) > 0:
-        elements[0]["category"] = "start_event"
-
-    return elements
+            if skipped_verbs is not None:
+                skipped_verbs.append(verb.i)
 
 
 def get_bpmn_elements(doc, process_elements):
-    elements = []
+    return build_graph(doc, process_elements).get_elements()
 
-    actor = "Default"
-    predecessor = None
-    open_gateways = {}
+
+def build_graph(doc, process_elements):
+    builder = GraphBuilder()
 
     for process_element in process_elements:
-        if process_element == process_elements[0] or process_element.get("category") in ["task", "intermediate_event", "start_event"]:
-            new_actor = get_actor_label(process_element["verb"])
-            if new_actor:
-                actor = new_actor
-        if process_element.get("category") == "start_event":
-            element = {
-                "category": "bpmn:StartEvent", "identifier": str(process_element["verb"].i),
-                "value": get_event_label(process_element["verb"]), "actor": actor, "predecessor": predecessor
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-        elif process_element.get("category") == "task":
-            element = {
-                "category": "bpmn:Task", "identifier": str(process_element["verb"].i),
-                "value": get_task_label(process_element["verb"]), "actor": actor, "predecessor": predecessor
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-        elif process_element.get("category") == "intermediate_event":
-            element = {
-                "category": "bpmn:IntermediateThrowEvent", "identifier": str(process_element["verb"].i),
-                "value": get_event_label(process_element["verb"]), "actor": actor, "predecessor": predecessor
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-        elif process_element.get("category") == "split_exclusive_gateway":
-            element = {
-                "category": "bpmn:ExclusiveGateway", "identifier": "ExclusiveGateway_" + str(process_element["verb"].i),
-                "value": get_conditional_label(doc, process_element["verb"]), "actor": actor, "predecessor": predecessor
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-            open_gateways[element.get("identifier")] = []
-        elif process_element.get("category") == "split_parallel_gateway":
-            element = {
-                "category": "bpmn:ParallelGateway", "identifier": "ParallelGateway_" + str(process_element["verb"].i),
-                "value": "", "actor": actor, "predecessor": predecessor
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-            open_gateways[element.get("identifier")] = []
-        elif process_element.get("category") == "sequence_flow_change":
-            if not open_gateways:
-                continue
+        builder.add(process_element, doc, process_element == process_elements[0])
 
-            last_gateway = list(open_gateways)[-1]
-            open_gateways[last_gateway].append(predecessor)
-            predecessor = last_gateway
-        elif process_element.get("category") == "join_gateway":
-            if not open_gateways:
-                continue
+    builder.finish()
+
+    return builder
+
+
+def get_identifier(process_element):
+    # Token index of the verb, shifted when the process description is parsed in several documents
+    return str(process_element.index + process_element.offset)
+
+
+class GraphNode:
+    __slots__ = ("element", "verb", "position", "next")
+
+    def __init__(self, element, verb, position):
+        self.element = element
+        self.verb = verb
+        self.position = position
+        self.next = None
+
+
+class GraphBuilder:
+    # Builds the BPMN elements in linear time: elements are looked up by identifier instead of searching the list and
+    # end events are linked in behind their predecessor instead of being inserted into the list
+    def __init__(self):
+        self.nodes = {}
+        self.first = None
+        self.last = None
+        self.size = 0
+
+        self.actor = "Default"
+        self.predecessor = None
+
+        # The ends of the branches of every open gateway, the innermost gateway is the last one
+        self.open_gateways = {}
+        self.unbranched_gateways = {}
+
+        # Appended and inserted elements, only recorded when set to a list
+        self.changes = None
+
+        # Sequence flow changes and joins without an open gateway and gateways still open at the end
+        self.unresolved = 0
 
-            last_gateway = list(open_gateways)[-1]
-            open_gateways[last_gateway].append(predecessor)
+    def add(self, process_element, doc, first=False):
+        # The document is the one the index of the process element refers to
+        category = process_element.category
+        verb = doc[process_element.index]
+
+        if first or category in ["task", "intermediate_event", "start_event"]:
+            new_actor = get_actor_label(verb)
+            if new_actor:
+                self.actor = new_actor
+        if category == "start_event":
+            self.append("bpmn:StartEvent", get_identifier(process_element), get_event_label(verb), verb)
+        elif category == "task":
+            self.append("bpmn:Task", get_identifier(process_element), get_task_label(verb), verb)
+        elif category == "intermediate_event":
+            self.append("bpmn:IntermediateThrowEvent", get_identifier(process_element), get_event_label(verb), verb)
+        elif category == "split_exclusive_gateway":
+            self.append(
+                "bpmn:ExclusiveGateway", "ExclusiveGateway_" + get_identifier(process_element),
+                get_conditional_label(doc, verb)
+            )
+            self.open_gateway(self.predecessor)
+        elif category == "split_parallel_gateway":
+            self.append("bpmn:ParallelGateway", "ParallelGateway_" + get_identifier(process_element), "")
+            self.open_gateway(self.predecessor)
+        elif category == "sequence_flow_change":
+            if not self.open_gateways:
+                self.unresolved += 1
+                return
+
+            last_gateway = self.get_last_gateway()
+            self.add_branch(last_gateway, self.predecessor)
+            self.predecessor = last_gateway
+        elif category == "join_gateway":
+            if not self.open_gateways:
+                self.unresolved += 1
+                return
+
+            last_gateway = self.get_last_gateway()
+            self.add_branch(last_gateway, self.predecessor)
 
             if "ExclusiveGateway" in last_gateway:
-                category = "bpmn:ExclusiveGateway"
+                self.append_join("bpmn:ExclusiveGateway", last_gateway, self.actor)
             else:
-                category = "bpmn:ParallelGateway"
-
-            element = {
-                "category": category, "identifier": last_gateway + "_Join",
-                "value": "", "actor": actor, "predecessors": open_gateways[last_gateway]
-            }
-            elements.append(element)
-            predecessor = element.get("identifier")
-            open_gateways.pop(last_gateway)
-        elif process_element.get("category") == "end_event":
-            if open_gateways:
-                last_gateway = list(open_gateways)[-1]
+                self.append_join("bpmn:ParallelGateway", last_gateway, self.actor)
+
+            self.close_gateway(last_gateway)
+        elif category == "end_event":
+            identifier = get_identifier(process_element)
+
+            if self.open_gateways:
+                last_gateway = self.get_last_gateway()
 
                 if "ParallelGateway" in last_gateway:
-                    open_gateways[last_gateway].append(predecessor)
-
-                    element = {
-                        "category": "bpmn:ParallelGateway", "identifier": last_gateway + "_Join",
-                        "value": "", "actor": actor, "predecessors": open_gateways[last_gateway]
-                    }
-                    elements.append(element)
-                    predecessor = element.get("identifier")
-                    element = {
-                        "category": "bpmn:EndEvent", "identifier": str(process_element["verb"].i),
-                        "value": "Process terminated", "actor": actor, "predecessor": predecessor
-                    }
+                    self.add_branch(last_gateway, self.predecessor)
+                    self.append_join("bpmn:ParallelGateway", last_gateway, self.actor)
+                    self.append("bpmn:EndEvent", identifier, "Process terminated", verb)
                 else:
-                    for last_element in open_gateways[last_gateway]:
-                        element = next(element for element in elements if element["identifier"] == last_element)
-
-                        if "Gateway" not in element.get("identifier"):
-                            value = get_event_label(doc[int(element.get("identifier"))])
-                        else:
-                            value = "Process terminated"
-
-                        end_event_element = {
-                            "category": "bpmn:EndEvent", "identifier": "EndEvent_" + element.get("identifier"),
-                            "value": value, "actor": element.get("actor"), "predecessor": element.get("identifier")
-                        }
-                        elements.insert(elements.index(element) + 1, end_event_element)
-
-                    element = {
-                        "category": "bpmn:EndEvent", "identifier": str(process_element["verb"].i),
-                        "value": get_event_label(doc[int(predecessor)]), "actor": actor, "predecessor": predecessor
-                    }
-
-                elements.append(element)
-                predecessor = last_gateway
-                open_gateways.pop(last_gateway)
+                    self.end_branches(last_gateway)
+                    self.append("bpmn:EndEvent", identifier, get_event_label(self.get_verb(self.predecessor)), verb)
+
+                self.predecessor = last_gateway
+                self.close_gateway(last_gateway)
             else:
-                if "Gateway" not in predecessor:
-                    value = get_event_label(doc[int(predecessor)])
+                if "Gateway" not in self.predecessor:
+                    value = get_event_label(self.get_verb(self.predecessor))
                 else:
                     value = "Process terminated"
 
-                element = {
-                    "category": "bpmn:EndEvent", "identifier": str(process_element["verb"].i),
-                    "value": value, "actor": actor, "predecessor": predecessor
-                }
-                elements.append(element)
-
-            for gateway in list(open_gateways):
-                if not open_gateways[gateway]:
-                    open_gateways.pop(gateway)
-                    predecessor = gateway
-
-    if open_gateways:
-        for gateway in list(open_gateways):
-            if gateway == list(open_gateways)[-1]:
-                open_gateways[gateway].append(predecessor)
-
-            if "ExclusiveGateway" in gateway:
-                for last_element in open_gateways[gateway]:
-                    element = next(element for element in elements if element["identifier"] == last_element)
-
-                    if "Gateway" not in element.get("identifier"):
-                        value = get_event_label(doc[int(element.get("identifier"))])
-                    else:
-                        value = "Process terminated"
-
-                    end_event_element = {
-                        "category": "bpmn:EndEvent", "identifier": "EndEvent_" + element.get("identifier"),
-                        "value": value, "actor": element.get("actor"), "predecessor": element.get("identifier")
-                    }
-                    elements.insert(elements.index(element) + 1, end_event_element)
-            else:
-                element = next(element for element in elements if element["identifier"] in open_gateways[gateway])
+                predecessor = self.predecessor
+                self.append("bpmn:EndEvent", identifier, value, verb)
+                self.predecessor = predecessor
 
-                parallel_gateway_join = {
-                    "category": "bpmn:ParallelGateway", "identifier": gateway + "_Join",
-                    "value": "", "actor": element.get("actor"), "predecessors": open_gateways[gateway]
-                }
-                elements.append(parallel_gateway_join)
+            # Gateways without any branch yet end here as well
+            for gateway in list(self.unbranched_gateways):
+                self.close_gateway(gateway)
+                self.predecessor = gateway
 
-                end_event_element = {
-                    "category": "bpmn:EndEvent", "identifier": "EndEvent_" + parallel_gateway_join.get("identifier"),
-                    "value": "Process terminated", "actor": element.get("actor"),
-                    "predecessor": parallel_gateway_join.get("identifier")
-                }
-                elements.append(end_event_element)
+    def finish(self):
+        if self.open_gateways:
+            self.unresolved += len(self.open_gateways)
+            last_gateway = self.get_last_gateway()
 
-            open_gateways.pop(gateway)
+            for gateway in list(self.open_gateways):
+                if gateway == last_gateway:
+                    self.add_branch(gateway, self.predecessor)
 
-    if len(elements) > 0:
-        if elements[-1].get("category") != "bpmn:EndEvent":
-            if "Gateway" not in predecessor:
-                value = get_event_label(doc[int(predecessor)])
+                if "ExclusiveGateway" in gateway:
+                    self.end_branches(gateway)
+                else:
+                    # The actor of the branch that comes first
+                    branches = [self.nodes[branch] for branch in self.open_gateways[gateway] if branch in self.nodes]
+                    node = min(branches, key=lambda branch: branch.position)
+
+                    actor = node.element.actor
+                    predecessor = self.predecessor
+                    join = self.append_join("bpmn:ParallelGateway", gateway, actor)
+                    self.append("bpmn:EndEvent", "EndEvent_" + join.identifier, "Process terminated", actor=actor)
+                    self.predecessor = predecessor
+
+                self.close_gateway(gateway)
+
+        if self.last is not None:
+            if self.last.element.category != "bpmn:EndEvent":
+                if "Gateway" not in self.predecessor:
+                    value = get_event_label(self.get_verb(self.predecessor))
+                else:
+                    value = "Process terminated"
+
+                self.append("bpmn:EndEvent", "EndEvent_" + self.predecessor, value)
+
+    def get_elements(self):
+        elements = []
+        node = self.first
+
+        while node is not None:
+            elements.append(node.element)
+            node = node.next
+
+        return elements
+
+    def append(self, category, identifier, value, verb=None, actor=None):
+        element = BpmnElement(
+            category, identifier, value, self.actor if actor is None else actor, predecessor=self.predecessor
+        )
+        self.link(GraphNode(element, verb, self.size), self.last)
+        self.predecessor = identifier
+
+        return element
+
+    def append_join(self, category, gateway, actor):
+        element = BpmnElement(category, gateway + "_Join", "", actor, predecessors=self.open_gateways[gateway])
+        self.link(GraphNode(element, None, self.size), self.last)
+        self.predecessor = element.identifier
+
+        return element
+
+    def end_branches(self, gateway):
+        # Every branch of an exclusive gateway without a join ends after its last element
+        for branch in self.open_gateways[gateway]:
+            node = self.nodes[branch]
+            element = node.element
+
+            if "Gateway" not in element.identifier:
+                value = get_event_label(node.verb)
             else:
                 value = "Process terminated"
 
-            elements.append({
-                "category": "bpmn:EndEvent", "identifier": "EndEvent_" + predecessor,
-                "value": value, "actor": actor, "predecessor": predecessor
-            })
+            end_event_element = BpmnElement(
+                "bpmn:EndEvent", "EndEvent_" + element.identifier, value, element.actor, predecessor=element.identifier
+            )
+            self.link(GraphNode(end_event_element, None, node.position), node)
 
-    return elements
+    def get_verb(self, identifier):
+        node = self.nodes.get(identifier)
+
+        if node is None or node.verb is None:
+            raise ValueError("There is no verb for the element " + str(identifier))
+
+        return node.verb
+
+    def link(self, node, previous):
+        if self.changes is not None:
+            if previous is self.last:
+                self.changes.append((None, node.element))
+            else:
+                self.changes.append((previous.element.identifier, node.element))
+
+        if previous is None:
+            self.first = node
+        else:
+            node.next = previous.next
+            previous.next = node
+
+        if previous is self.last:
+            self.last = node
+
+        self.size += 1
+        self.nodes.setdefault(node.element.identifier, node)
+
+    def open_gateway(self, gateway):
+        if gateway in self.open_gateways and gateway not in self.unbranched_gateways:
+            # A gateway that is opened again keeps its place
+            self.open_gateways[gateway] = []
+            self.unbranched_gateways = {name: None for name, branches in self.open_gateways.items() if not branches}
+        else:
+            self.open_gateways[gateway] = []
+            self.unbranched_gateways[gateway] = None
+
+    def get_last_gateway(self):
+        return next(reversed(self.open_gateways))
+
+    def add_branch(self, gateway, predecessor):
+        self.open_gateways[gateway].append(predecessor)
+        self.unbranched_gateways.pop(gateway, None)
+
+    def close_gateway(self, gateway):
+        self.open_gateways.pop(gateway)
+        self.unbranched_gateways.pop(gateway, None)
+
+
+class DependencyIndex:
+    # The tokens are looked up in the document of the given token, the index must not keep its document alive
+    def __init__(self, doc):
+        self.heads = [None] * len(doc)
+        self.dependencies = [None] * len(doc)
+        self.children_by_dependency = [{} for token in doc]
+        self.conjunct_roots = [None] * len(doc)
+
+        for token in doc:
+            self.dependencies[token.i] = token.dep_
+
+            if token.head.i != token.i:
+                self.heads[token.i] = token.head.i
+                self.children_by_dependency[token.head.i].setdefault(token.dep_, []).append(token.i)
+
+    def get_head(self, token, dependency):
+        if self.dependencies[token.i] != dependency or self.heads[token.i] is None:
+            return None
+
+        return token.doc[self.heads[token.i]]
+
+    def get_conjunct_root(self, token):
+        # The first verb of a chain of conjunct verbs
+        path = []
+        current = token.i
+
+        while self.conjunct_roots[current] is None:
+            path.append(current)
+
+            if self.dependencies[current] != "conj" or self.heads[current] is None:
+                self.conjunct_roots[current] = current
+                break
+
+            current = self.heads[current]
+
+        for conjunct in path:
+            self.conjunct_roots[conjunct] = self.conjunct_roots[current]
+
+        return token.doc[self.conjunct_roots[current]]
+
+    def get_child(self, token, dependency):
+        children = self.children_by_dependency[token.i].get(dependency)
+
+        if not children:
+            return None
+
+        return token.doc[children[0]]
+
+    def get_children(self, token, dependency):
+        return [token.doc[child] for child in self.children_by_dependency[token.i].get(dependency, [])]
+
+    def has_child(self, token, dependency):
+        return dependency in self.children_by_dependency[token.i]
+
+
+dependency_indexes = weakref.WeakKeyDictionary()
+
+
+def get_dependency_index(doc):
+    index = dependency_indexes.get(doc)
+
+    if index is None:
+        index = DependencyIndex(doc)
+        dependency_indexes[doc] = index
+
+    return index
+
+
+unknown = object()
+
+
+class VerbAnalysis:
+    # What the rules derive from a verb, each computed on first use and then shared by both passes. Only strings and
+    # flags are kept, so that the table does not keep its document alive.
+    __slots__ = ("passive", "actor", "business_object", "particle", "task_label", "event_label")
+
+    def __init__(self):
+        self.passive = unknown
+        self.actor = unknown
+        self.business_object = unknown
+        self.particle = unknown
+        self.task_label = unknown
+        self.event_label = unknown
+
+
+verb_analyses = weakref.WeakKeyDictionary()
+
+
+def get_analysis(verb, name, find):
+    analyses = verb_analyses.get(verb.doc)
+
+    if analyses is None:
+        analyses = {}
+        verb_analyses[verb.doc] = analyses
+
+    analysis = analyses.get(verb.i)
+
+    if analysis is None:
+        analysis = VerbAnalysis()
+        analyses[verb.i] = analysis
+
+    value = getattr(analysis, name)
+
+    if value is unknown:
+        value = find(verb)
+        setattr(analysis, name, value)
+
+    return value
+
+
+inflections = OrderedDict()
+inflections_lock = threading.Lock()
+
+
+def get_past_participle(verb):
+    # The inflection only depends on these attributes of the verb, so it is shared between documents
+    key = (verb.text, verb.tag_, verb.pos_, verb.lemma_)
+
+    with inflections_lock:
+        if key in inflections:
+            inflections.move_to_end(key)
+
+            return inflections[key]
+
+    inflection = verb._.inflect("VBN")
+
+    with inflections_lock:
+        inflections[key] = inflection
+
+        while len(inflections) > settings.NLP_INFLECTION_CACHE_SIZE:
+            inflections.popitem(last=False)
+
+    return inflection
 
 
 def get_parent_verb(verb):
-    return next((ancestor for ancestor in verb.ancestors if (verb in ancestor.children and verb.dep_ == "xcomp")), None)
+    return get_dependency_index(verb.doc).get_head(verb, "xcomp")
 
 
 def get_conjunct_children_verb(verb):
-    return next((child for child in verb.children if (child.dep_ == "conj")), None)
+    return get_dependency_index(verb.doc).get_child(verb, "conj")
 
 
 def get_conjunct_parent_verb(verb):
-    return next((ancestor for ancestor in verb.ancestors if (verb in ancestor.children and verb.dep_ == "conj")), None)
+    return get_dependency_index(verb.doc).get_head(verb, "conj")
 
 
 def get_verb_particle(verb):
-    return next((child for child in verb.children if (child.dep_ == "prt")), None)
+    return get_dependency_index(verb.doc).get_child(verb, "prt")
+
+
+def get_particle(verb):
+    return get_analysis(verb, "particle", find_particle)
+
+
+def find_particle(verb):
+    verb_particle = get_verb_particle(verb)
+
+    return verb_particle.text if verb_particle else None
 
 
 def has_children_verbs(verb):
-    verbs = list(child for child in verb.children if (child.dep_ == "xcomp"))
+    return get_dependency_index(verb.doc).has_child(verb, "xcomp")
 
-    if verbs:
-        return True
-    else:
-        return False
 
+class ProcessRoles:
+    def __init__(self):
+        self.split_exclusive_gateways = {}
+        self.split_parallel_gateways = set()
+        self.sequence_flow_changes = set()
+        self.join_gateways = set()
+        self.end_events = set()
+        self.intermediate_events = set()
 
-def detect_split_exclusive_gateway(verb):
-    parent_verb = get_parent_verb(verb)
 
-    if parent_verb:
-        return detect_split_exclusive_gateway(parent_verb)
+# The roles a verb can play in the process, each as the lemmas the verb must have and the dependency label and
+# indicator phrases of one of its children
+role_patterns = {
+    "split_exclusive_gateway": (None, "mark", split_exclusive_gateway_indicators),
+    "split_parallel_gateway": (None, "mark", split_parallel_gateway_indicators),
+    "sequence_flow_change": (None, "advmod", sequence_flow_change_indicators),
+    "join_gateway": (join_gateway_verbs, "nsubjpass", join_gateway_indicators),
+    "end_event": (end_event_verbs, "nsubj", end_event_indicators),
+    "intermediate_event": (None, "mark", intermediate_event_indicators)
+}
 
-    conjunct_parent_verb = get_conjunct_parent_verb(verb)
+join_gateway_pattern = re.compile("|".join(re.escape(indicator) for indicator in join_gateway_indicators))
 
-    if conjunct_parent_verb:
-        return detect_split_exclusive_gateway(conjunct_parent_verb)
+ignored_prepositional_pattern = re.compile("|".join(re.escape(phrase) for phrase in ignored_prepositional_phrases))
 
-    mark = next((child for child in verb.children if (child.dep_ == "mark" and child.text.lower() in split_exclusive_gateway_indicators)), None)
+role_matcher = None
+role_matcher_lock = threading.Lock()
 
-    if mark:
-        return verb
+process_roles = weakref.WeakKeyDictionary()
 
-    if verb == verb.sent.root:
-        return None
 
-    indicator_phrase = get_indicator_phrase(verb.sent.root)
+@Language.factory("process_roles")
+def create_process_roles(nlp, name):
+    get_role_matcher(nlp.vocab)
 
-    if indicator_phrase in split_exclusive_gateway_indicators:
-        return verb
+    return annotate_process_roles
 
-    return None
 
+def annotate_process_roles(doc):
+    if doc.has_annotation("SENT_START"):
+        get_process_roles(doc)
 
-def detect_split_parallel_gateway(verb):
-    mark = next((child for child in verb.children if (child.dep_ == "mark" and child.text.lower() in split_parallel_gateway_indicators)), None)
+    return doc
 
-    if mark:
-        return verb
 
-    indicator_phrase = get_indicator_phrase(verb)
+def get_role_matcher(vocab):
+    global role_matcher
 
-    if indicator_phrase in split_parallel_gateway_indicators:
-        return verb
+    with role_matcher_lock:
+        if role_matcher is None:
+            # Matching the indicators and looking up their heads is much faster than a DependencyMatcher, whose verb
+            # node would have to match every token
+            matcher = Matcher(vocab)
+            names = {}
 
-    return None
+            for role, (verbs, dependency, indicators) in role_patterns.items():
+                matcher.add(role, [[{"DEP": dependency, "LOWER": {"IN": indicators}}]])
+                names[vocab.strings[role]] = role
 
+            role_matcher = (matcher, names)
 
-def detect_sequence_flow_change(verb):
-    advmod = next((child for child in verb.children if (child.dep_ == "advmod" and child.text.lower() in sequence_flow_change_indicators)), None)
+    return role_matcher
+
+
+def get_process_roles(doc):
+    roles = process_roles.get(doc)
+
+    if roles is None:
+        roles = find_process_roles(doc)
+        process_roles[doc] = roles
+
+    return roles
+
+
+def find_process_roles(doc):
+    roles = ProcessRoles()
+    marks = {role: set() for role in role_patterns}
+    index = get_dependency_index(doc)
+
+    if doc.has_annotation("DEP"):
+        matcher, names = get_role_matcher(doc.vocab)
+
+        for match_id, indicator, end in matcher(doc):
+            role = names[match_id]
+            verb = index.heads[indicator]
+            verbs = role_patterns[role][0]
+
+            if verb is not None and (verbs is None or doc[verb].lemma_ in verbs):
+                marks[role].add(verb)
+
+    indicator_phrases = [get_indicator_phrase(token) for token in doc]
+    sentence_roots = [None] * len(doc)
+
+    for sent in doc.sents:
+        for token in sent:
+            sentence_roots[token.i] = sent.root
+
+        # Only the head of the first token of a sentence can be a join gateway introduced by the sentence
+        first = doc[sent.start]
+        head = index.heads[first.i]
+
+        if head is not None and doc[head].lemma_ in join_gateway_verbs:
+            if join_gateway_pattern.search(doc[sent.start:head].text.lower()):
+                roles.join_gateways.add(head)
+
+    for token in doc:
+        # Verbs in open clausal complements and conjunctions belong to the gateway of their head verb
+        verb = token
 
-    if advmod:
+        while index.dependencies[verb.i] in ("xcomp", "conj") and index.heads[verb.i] is not None:
+            verb = doc[index.heads[verb.i]]
+
+        if verb.i in marks["split_exclusive_gateway"]:
+            roles.split_exclusive_gateways[token.i] = verb.i
+        elif verb != sentence_roots[verb.i]:
+            if indicator_phrases[sentence_roots[verb.i].i] in split_exclusive_gateway_indicators:
+                roles.split_exclusive_gateways[token.i] = verb.i
+
+        if token.i in marks["split_parallel_gateway"] or indicator_phrases[token.i] in split_parallel_gateway_indicators:
+            roles.split_parallel_gateways.add(token.i)
+
+        if token.i in marks["sequence_flow_change"] or indicator_phrases[token.i] in sequence_flow_change_indicators:
+            roles.sequence_flow_changes.add(token.i)
+
+    roles.join_gateways.update(marks["join_gateway"])
+    roles.end_events.update(marks["end_event"])
+    roles.intermediate_events.update(marks["intermediate_event"])
+
+    return roles
+
+
+def detect_split_exclusive_gateway(verb):
+    split_exclusive_gateway = get_process_roles(verb.doc).split_exclusive_gateways.get(verb.i)
+
+    if split_exclusive_gateway is None:
+        return None
+
+    return verb.doc[split_exclusive_gateway]
+
+
+def detect_split_parallel_gateway(verb):
+    if verb.i in get_process_roles(verb.doc).split_parallel_gateways:
         return verb
 
-    indicator_phrase = get_indicator_phrase(verb)
+    return None
+
 
-    if indicator_phrase in sequence_flow_change_indicators:
+def detect_sequence_flow_change(verb):
+    if verb.i in get_process_roles(verb.doc).sequence_flow_changes:
         return verb
 
     return None
 
 
 def detect_join_gateway(doc, verb):
-    nsubjpass = next((child for child in verb.children if (child.dep_ == "nsubjpass" and child.text.lower() in join_gateway_indicators)), None)
-
-    if verb.lemma_ in join_gateway_verbs and nsubjpass:
+    if verb.i in get_process_roles(doc).join_gateways:
         return verb
 
-    if verb.lemma_ in join_gateway_verbs and doc[verb.sent.start] in verb.children:
-        if any(indicator for indicator in join_gateway_indicators if indicator in doc[verb.sent.start:verb.i].text.lower()):
-            return verb
-
     return None
 
 
 def detect_end_event(verb):
-    has_indicator = any(child for child in verb.children if (child.dep_ == "nsubj" and child.text.lower() in end_event_indicators))
-    has_verb = (verb.lemma_ in end_event_verbs)
-
-    if has_indicator and has_verb:
+    if verb.i in get_process_roles(verb.doc).end_events:
         return verb
 
     return None
 
 
 def detect_intermediate_event(verb):
-    has_indicator = any(child for child in verb.children if (child.dep_ == "mark" and child.text.lower() in intermediate_event_indicators))
-
-    if has_indicator:
+    if verb.i in get_process_roles(verb.doc).intermediate_events:
         return verb
 
     return None
 
 
 def get_indicator_phrase(verb):
-    prep = next((child for child in verb.children if (child.dep_ == "prep")), None)
+    index = get_dependency_index(verb.doc)
+    prep = index.get_child(verb, "prep")
 
     if prep:
-        pobj = next((child for child in prep.children if (child.dep_ == "pobj")), None)
+        pobj = index.get_child(prep, "pobj")
 
         if pobj:
             return (prep.text + " " + pobj.text).lower()
@@ -428,27 +976,35 @@ def get_indicator_phrase(verb):
 
 
 def get_event_label(verb):
+    return get_analysis(verb, "event_label", find_event_label)
+
+
+def find_event_label(verb):
     business_object = get_business_object(verb)
 
     if business_object:
-        verb_particle = get_verb_particle(verb)
+        verb_particle = get_particle(verb)
 
         if verb_particle:
-            return clean_label(business_object + " " + verb._.inflect("VBN") + " " + verb_particle.text)
+            return clean_label(business_object + " " + get_past_participle(verb) + " " + verb_particle)
 
-        return clean_label(business_object + " " + verb._.inflect("VBN"))
+        return clean_label(business_object + " " + get_past_participle(verb))
 
     return None
 
 
 def get_task_label(verb):
+    return get_analysis(verb, "task_label", find_task_label)
+
+
+def find_task_label(verb):
     business_object = get_business_object(verb)
 
     if business_object:
-        verb_particle = get_verb_particle(verb)
+        verb_particle = get_particle(verb)
 
         if verb_particle:
-            return clean_label(verb.lemma_ + " " + verb_particle.text + " " + business_object)
+            return clean_label(verb.lemma_ + " " + verb_particle + " " + business_object)
 
         return clean_label(verb.lemma_ + " " + business_object)
 
@@ -465,11 +1021,17 @@ def get_conditional_label(doc, verb):
 
 
 def get_actor_label(verb):
+    return get_analysis(verb, "actor", find_actor_label)
+
+
+def find_actor_label(verb):
+    index = get_dependency_index(verb.doc)
+
     if is_passive_verb(verb):
-        agent = next((child for child in verb.children if (child.dep_ == "agent")), None)
+        agent = index.get_child(verb, "agent")
 
         if agent:
-            actor = next((child for child in agent.children if (child.dep_ == "pobj")), None)
+            actor = index.get_child(agent, "pobj")
 
             if actor:
                 return clean_actor_label(actor.text)
@@ -479,7 +1041,7 @@ def get_actor_label(verb):
         if conjunct_children_verb:
             return get_actor_label(conjunct_children_verb)
     else:
-        actor = next((child for child in verb.children if (child.dep_ == "nsubj")), None)
+        actor = index.get_child(verb, "nsubj")
 
         if actor:
             return clean_actor_label(actor.text)
@@ -493,13 +1055,19 @@ def get_actor_label(verb):
 
 
 def get_business_object(verb):
+    return get_analysis(verb, "business_object", find_business_object)
+
+
+def find_business_object(verb):
+    index = get_dependency_index(verb.doc)
+
     if is_passive_verb(verb):
         parent_verb = get_parent_verb(verb)
 
         if parent_verb:
             return get_business_object(parent_verb)
 
-        label = next((child for child in verb.children if (child.dep_ == "nsubjpass")), None)
+        label = index.get_child(verb, "nsubjpass")
 
         if label:
             prepositional_phrase_verb = get_prepositional_phrase(verb)
@@ -522,12 +1090,12 @@ def get_business_object(verb):
             return get_business_object(conjunct_parent_verb)
     else:
         if has_children_verbs(verb):
-            label = next((child for child in verb.children if (child.dep_ == "nsubj")), None)
+            label = index.get_child(verb, "nsubj")
 
             if label:
                 return label.text
         else:
-            label = next((child for child in verb.children if (child.dep_ == "dobj")), None)
+            label = index.get_child(verb, "dobj")
 
             if label:
                 prepositional_phrase_verb = get_prepositional_phrase(verb)
@@ -563,19 +1131,20 @@ def get_business_object(verb):
 
 
 def get_prepositional_phrase(token):
-    prepositions = list(child for child in token.children if (child.dep_ == "prep"))
+    index = get_dependency_index(token.doc)
+    prepositions = index.get_children(token, "prep")
     prepositional_phrase = ""
 
     while prepositions:
         for preposition in prepositions:
-            pobj = next((child for child in preposition.children if (child.dep_ == "pobj")), None)
+            pobj = index.get_child(preposition, "pobj")
 
             if pobj:
                 text = preposition.text + " " + pobj.text
 
-                if not any(phrase for phrase in ignored_prepositional_phrases if phrase in text.lower()):
+                if not ignored_prepositional_pattern.search(text.lower()):
                     prepositional_phrase += text + " "
-                    prepositions.extend(list(child for child in pobj.children if (child.dep_ == "prep")))
+                    prepositions.extend(index.get_children(pobj, "prep"))
 
             prepositions.remove(preposition)
 
@@ -586,13 +1155,15 @@ def get_prepositional_phrase(token):
 
 
 def is_passive_verb(verb):
-    conjunct_parent_verb = get_conjunct_parent_verb(verb)
+    return get_analysis(verb, "passive", find_passive_voice)
+
 
-    if conjunct_parent_verb:
-        return is_passive_verb(conjunct_parent_verb)
+def find_passive_voice(verb):
+    index = get_dependency_index(verb.doc)
+    verb = index.get_conjunct_root(verb)
 
-    has_auxpass = any(child for child in verb.children if (child.dep_ == "auxpass"))
-    has_nsubjpass = any(child for child in verb.children if (child.dep_ == "nsubjpass"))
+    has_auxpass = index.has_child(verb, "auxpass")
+    has_nsubjpass = index.has_child(verb, "nsubjpass")
 
     if has_auxpass and has_nsubjpass:
         return True
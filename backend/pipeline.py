@@ -0,0 +1,87 @@
+import threading
+
+from django.conf import settings
+
+pipelines = {}
+pipelines_lock = threading.Lock()
+loading_locks = {}
+
+
+def get_pipeline(tier=None):
+    return get_or_load(get_model(tier), load_pipeline)
+
+
+def get_model(tier=None):
+    tier = tier or settings.NLP_MODEL_TIER
+
+    if tier not in settings.NLP_MODELS:
+        raise ValueError("Unknown model tier: " + str(tier))
+
+    return settings.NLP_MODELS[tier]
+
+
+def get_sentencizer():
+    return get_or_load("sentencizer", load_sentencizer)
+
+
+def get_or_load(name, loader):
+    nlp = pipelines.get(name)
+
+    if nlp is None:
+        # Every pipeline has its own lock, so that loading one does not block the others
+        with get_loading_lock(name):
+            nlp = pipelines.get(name)
+
+            if nlp is None:
+                nlp = loader(name)
+                pipelines[name] = nlp
+
+    return nlp
+
+
+def get_loading_lock(name):
+    with pipelines_lock:
+        return loading_locks.setdefault(name, threading.Lock())
+
+
+def load_pipeline(model, inference=None):
+    import spacy
+
+    # Registers the process_roles component
+    import backend.nlp
+    from backend.inference import optimize_pipeline
+
+    nlp = spacy.load(model)
+    nlp.add_pipe("merge_noun_chunks")
+    nlp.add_pipe("process_roles")
+
+    return optimize_pipeline(nlp, inference or settings.NLP_INFERENCE)
+
+
+def load_sentencizer(name):
+    import spacy
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+
+    return nlp
+
+
+def get_sentence_boundaries(text):
+    # Character offsets of the sentences, each including its trailing whitespace, so that they add up to the text
+    starts = [sent.start_char for sent in get_sentencizer()(text).sents]
+
+    if not starts:
+        return []
+
+    starts[0] = 0
+
+    return list(zip(starts, starts[1:] + [len(text)]))
+
+
+def get_warm_up_text():
+    if not settings.NLP_WARM_UP_FILE:
+        return None
+
+    with open(settings.NLP_WARM_UP_FILE, encoding="utf-8") as file:
+        return file.read().strip()
@@ -0,0 +1,79 @@
+import functools
+import logging
+import threading
+
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+loaded = threading.Event()
+started = False
+error = None
+
+
+def preload():
+    if settings.NLP_PRELOAD:
+        load_pipelines(settings.NLP_PRELOAD_IN_BACKGROUND)
+
+
+def load_pipelines(background):
+    global started
+
+    started = True
+
+    if not background:
+        warm_up()
+        return
+
+    # The worker answers requests while the pipelines load, the API responds with 503 until they are ready
+    threading.Thread(target=load_in_background, name="load-pipelines", daemon=True).start()
+
+
+def load_in_background():
+    global error
+
+    try:
+        warm_up()
+    except Exception as exception:
+        logger.exception("Loading the pipelines failed")
+        error = str(exception) or type(exception).__name__
+
+
+def warm_up():
+    # spaCy is only imported here, not when the worker boots. The validation does not need the pipelines, so it is
+    # ready before them.
+    from backend.nlp import warm_up
+    from backend.validation import warm_up as warm_up_validation
+
+    warm_up_validation()
+    warm_up()
+    loaded.set()
+
+
+def get_status():
+    # Without preloading, the pipelines are loaded by the first request that needs them
+    if loaded.is_set() or not started:
+        return "ready"
+
+    return "failed" if error is not None else "loading"
+
+
+def require_ready(view):
+    # Requests arriving before the pipelines are loaded get an immediate answer instead of waiting for the model
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        status = get_status()
+
+        if status == "failed":
+            return JsonResponse({"error": "The model could not be loaded."}, status=503)
+
+        if status == "loading":
+            response = JsonResponse({"error": "The model is still loading, try again later."}, status=503)
+            response["Retry-After"] = str(settings.NLP_RETRY_AFTER)
+
+            return response
+
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,57 @@
+import json
+from dataclasses import dataclass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class ProcessElement:
+    # The verb is kept as its index in the document, the token is only created when a label needs it
+    category: str
+    index: int
+    offset: int = 0
+
+
+@dataclass(slots=True)
+class BpmnElement:
+    # The fields are the schema of the API in this order, joins have predecessors and all others a predecessor
+    category: str
+    identifier: str
+    value: str
+    actor: str
+    predecessor: str = None
+    predecessors: list = None
+
+    def to_dict(self):
+        element = {"category": self.category, "identifier": self.identifier, "value": self.value, "actor": self.actor}
+
+        if self.predecessors is None:
+            element["predecessor"] = self.predecessor
+        else:
+            element["predecessors"] = self.predecessors
+
+        return element
+
+
+def encode(value):
+    # The elements are encoded by to_dict, not as dataclasses, so that they only have the keys of their category
+    if orjson is not None:
+        return orjson.dumps(value, default=get_dict, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    return json.dumps(value, default=get_dict, separators=(",", ":")).encode("utf-8")
+
+
+def decode_elements(data):
+    items = orjson.loads(data) if orjson is not None else json.loads(data)
+
+    return [BpmnElement(**item) for item in items]
+
+
+def get_dict(value):
+    if isinstance(value, BpmnElement):
+        return value.to_dict()
+
+    raise TypeError("Object of type " + type(value).__name__ + " is not JSON serializable")
@@ -0,0 +1,63 @@
+from django.conf import settings
+
+from backend.cache import normalize_text
+from backend.nlp import GraphBuilder, add_process_elements
+from backend.pipeline import get_pipeline, get_sentence_boundaries
+
+
+def parse_stream(text, tier=None):
+    # Yields records as soon as the sentences are processed: an element record for every new element and an insert
+    # record for an end event that goes after an element that was already sent
+    text = normalize_text(text)
+    nlp = get_pipeline(tier)
+    sentences = [text[start:end] for start, end in get_sentence_boundaries(text)]
+
+    builder = GraphBuilder()
+    builder.changes = []
+    process_elements = []
+    offset = 0
+    count = 0
+
+    # Every sentence is a document of its own, the offset of a process element tells which one its index refers to
+    docs = {}
+
+    for doc in nlp.pipe(sentences, batch_size=settings.NLP_STREAM_BATCH_SIZE):
+        add_process_elements(doc, process_elements, offset=offset)
+        docs[offset] = doc
+        offset += len(doc)
+
+        # The last process element is held back, the next sentence can still put a split parallel gateway before it
+        for process_element in process_elements[:-1]:
+            add(builder, process_element, docs[process_element.offset], count == 0)
+            count += 1
+
+        del process_elements[:-1]
+        docs = {process_element.offset: docs[process_element.offset] for process_element in process_elements}
+
+        yield from get_records(builder)
+
+    for process_element in process_elements:
+        add(builder, process_element, docs[process_element.offset], count == 0)
+        count += 1
+
+    builder.finish()
+
+    yield from get_records(builder)
+    yield {"type": "end"}
+
+
+def add(builder, process_element, doc, first):
+    if first:
+        process_element.category = "start_event"
+
+    builder.add(process_element, doc, first)
+
+
+def get_records(builder):
+    for predecessor, element in builder.changes:
+        if predecessor is None:
+            yield {"type": "element", "element": element}
+        else:
+            yield {"type": "insert", "after": predecessor, "element": element}
+
+    builder.changes.clear()
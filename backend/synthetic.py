@@ -0,0 +1,161 @@
+import random
+
+from spacy.tokens import Doc
+
+actors = ["the clerk", "the manager", "the customer", "the IT department", "the logistics department"]
+
+business_objects = ["the application", "the invoice", "the order", "the documents", "the ticket", "the contract"]
+
+verbs = [
+    ("checks", "check"), ("sends", "send"), ("prepares", "prepare"), ("approves", "approve"), ("archives", "archive"),
+    ("signs", "sign"), ("reviews", "review"), ("updates", "update")
+]
+
+
+# Each sentence is a list of tokens as (text, part of speech, tag, lemma, dependency label, index of the head) after
+# merging the noun chunks, with the index relative to the sentence
+
+def task(rng):
+    verb, lemma = rng.choice(verbs)
+
+    return [
+        (rng.choice(actors), "NOUN", "NN", None, "nsubj", 1), (verb, "VERB", "VBZ", lemma, "ROOT", 1),
+        (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 1), (".", "PUNCT", ".", ".", "punct", 1)
+    ]
+
+
+def condition(rng):
+    verb, lemma = rng.choice(verbs)
+    condition_verb, condition_lemma = rng.choice(verbs)
+
+    return [
+        ("If", "SCONJ", "IN", "if", "mark", 2), (rng.choice(actors), "NOUN", "NN", None, "nsubj", 2),
+        (condition_verb, "VERB", "VBZ", condition_lemma, "advcl", 6),
+        (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 2), (",", "PUNCT", ",", ",", "punct", 6),
+        (rng.choice(actors), "NOUN", "NN", None, "nsubj", 6), (verb, "VERB", "VBZ", lemma, "ROOT", 6),
+        (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 6), (".", "PUNCT", ".", ".", "punct", 6)
+    ]
+
+
+def otherwise(rng):
+    verb, lemma = rng.choice(verbs)
+
+    return [
+        ("Otherwise", "ADV", "RB", "otherwise", "advmod", 3), (",", "PUNCT", ",", ",", "punct", 3),
+        (rng.choice(actors), "NOUN", "NN", None, "nsubj", 3), (verb, "VERB", "VBZ", lemma, "ROOT", 3),
+        (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 3), (".", "PUNCT", ".", ".", "punct", 3)
+    ]
+
+
+def same_time(rng):
+    verb, lemma = rng.choice(verbs)
+
+    return [
+        ("At", "ADP", "IN", "at", "prep", 4), ("the same time", "NOUN", "NN", None, "pobj", 0),
+        (",", "PUNCT", ",", ",", "punct", 4), (rng.choice(actors), "NOUN", "NN", None, "nsubj", 4),
+        (verb, "VERB", "VBZ", lemma, "ROOT", 4), (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 4),
+        (".", "PUNCT", ".", ".", "punct", 4)
+    ]
+
+
+def join(rng):
+    verb, lemma = rng.choice(verbs)
+
+    return [
+        ("After", "SCONJ", "IN", "after", "mark", 4), ("these tasks", "NOUN", "NNS", None, "nsubjpass", 4),
+        ("have", "AUX", "VBP", "have", "aux", 4), ("been", "AUX", "VBN", "be", "auxpass", 4),
+        ("completed", "VERB", "VBN", "complete", "advcl", 7), (",", "PUNCT", ",", ",", "punct", 7),
+        (rng.choice(actors), "NOUN", "NN", None, "nsubj", 7), (verb, "VERB", "VBZ", lemma, "ROOT", 7),
+        (rng.choice(business_objects), "NOUN", "NN", None, "dobj", 7), (".", "PUNCT", ".", ".", "punct", 7)
+    ]
+
+
+def end():
+    return [
+        ("The process", "NOUN", "NN", None, "nsubj", 1), ("ends", "VERB", "VBZ", "end", "ROOT", 1),
+        (".", "PUNCT", ".", ".", "punct", 1)
+    ]
+
+
+def get_sentences(count, seed=0, depth=3):
+    # Tasks, exclusive gateways with two branches and parallel gateways, nested up to the given depth and joined again
+    # or ended early
+    rng = random.Random(seed)
+    sentences = []
+
+    def block(budget, level):
+        while budget > 0:
+            choice = rng.random()
+
+            if budget >= 6 and choice < 0.05:
+                size = rng.randint(1, min(budget - 4, 10) // 2)
+                sentences.append(condition(rng))
+                block(size, depth)
+                sentences.append(otherwise(rng))
+                block(size, depth)
+                sentences.append(end())
+                budget -= 2 * size + 3
+            elif level < depth and budget >= 6 and choice < 0.2:
+                size = rng.randint(1, max(1, min(budget - 4, 20)) // 2)
+                sentences.append(condition(rng))
+                block(size, level + 1)
+                sentences.append(otherwise(rng))
+                block(size, level + 1)
+                sentences.append(join(rng))
+                budget -= 2 * size + 3
+            elif level < depth and budget >= 4 and choice < 0.3:
+                sentences.append(task(rng))
+                sentences.append(same_time(rng))
+                sentences.append(join(rng))
+                budget -= 3
+            else:
+                sentences.append(task(rng))
+                budget -= 1
+
+    sentences.append(task(rng))
+    block(count - 2, 0)
+    sentences.append(end())
+
+    for sentence in sentences:
+        sentence[0] = (sentence[0][0][0].upper() + sentence[0][0][1:],) + sentence[0][1:]
+
+    return sentences
+
+
+def get_text(count, seed=0):
+    return " ".join(get_sentence_text(sentence) for sentence in get_sentences(count, seed))
+
+
+def get_doc(vocab, count, seed=0):
+    # A parsed document as the pipeline would create it, for benchmarking the rules without loading a model
+    words, spaces, pos, tags, lemmas, deps, heads = [], [], [], [], [], [], []
+
+    for sentence in get_sentences(count, seed):
+        offset = len(words)
+
+        for index, (text, part_of_speech, tag, lemma, dependency, head) in enumerate(sentence):
+            words.append(text)
+            spaces.append(index + 1 < len(sentence) and sentence[index + 1][0] not in (",", "."))
+            pos.append(part_of_speech)
+            tags.append(tag)
+            lemmas.append(lemma or text.lower())
+            deps.append(dependency)
+            heads.append(offset + head)
+
+        spaces[-1] = True
+
+    spaces[-1] = False
+
+    return Doc(vocab, words=words, spaces=spaces, pos=pos, tags=tags, lemmas=lemmas, deps=deps, heads=heads)
+
+
+def get_sentence_text(sentence):
+    text = ""
+
+    for text_token, part_of_speech, tag, lemma, dependency, head in sentence:
+        if text and text_token not in (",", "."):
+            text += " "
+
+        text += text_token
+
+    return text
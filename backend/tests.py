@@ -1,3 +1,467 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import spacy
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from spacy.tokens import Doc
+
+from backend import metrics, pipeline
+from backend.admission import AdmissionController, Rejection
+from backend.bpmn import serialize_bpmn
+from backend.cache import ResultCache, get_cache_key, normalize_text
+from backend.chunking import get_chunked_doc, get_chunks
+from backend.incremental import get_delta
+from backend.jobs import claim_job, fail_running_jobs, submit_job, worker_stopped
+from backend.management.commands.compare_tiers import get_content_delta
+from backend.models import Job
+from backend.nlp import extract, get_bpmn_elements, get_process_elements, parse_batch, result_cache
+from backend.pipeline import get_sentence_boundaries
+from backend.records import BpmnElement
+from backend.streaming import parse_stream
+from backend.synthetic import get_doc
+from backend.validation import validate
+
+# Process models of synthetic documents as the extraction rules produced them when the fixture was written. After an
+# intended change of the rules, write it again with
+# python manage.py shell -c "from backend.tests import write_fixture; write_fixture()"
+fixture_path = os.path.join(os.path.dirname(__file__), 'testdata', 'synthetic_elements.json')
+
+sizes = [3, 10, 30]
+seeds = range(8)
+
+
+def get_results():
+    vocab = spacy.blank('en').vocab
+    results = []
+
+    for size in sizes:
+        for seed in seeds:
+            doc = get_doc(vocab, size, seed)
+            process_elements = get_process_elements(doc)
+            bpmn_elements = get_bpmn_elements(doc, process_elements)
+
+            results.append({
+                'size': size,
+                'seed': seed,
+                'process_elements': [[element.category, element.index] for element in process_elements],
+                'bpmn_elements': [element.to_dict() for element in bpmn_elements]
+            })
+
+    return results
+
+
+def write_fixture():
+    with open(fixture_path, 'w', encoding='utf-8') as file:
+        json.dump(get_results(), file, indent=1)
+        file.write('\n')
+
+
+class ExtractionTests(SimpleTestCase):
+    def test_synthetic_documents(self):
+        with open(fixture_path, encoding='utf-8') as file:
+            expected = json.load(file)
+
+        for result, expected_result in zip(get_results(), expected):
+            with self.subTest(size=result['size'], seed=result['seed']):
+                self.assertEqual(result, expected_result)
+
+        self.assertEqual(len(expected), len(sizes) * len(seeds))
+
+
+class StubPipeline:
+    # Stands in for a model: the texts are synthetic documents or their sentences, which are looked up instead of
+    # parsed. Texts containing "fail" raise an error, in nlp.pipe for the whole batch.
+    def __init__(self, docs):
+        self.meta = {'lang': 'en', 'name': 'stub', 'version': '0.0.0'}
+        self.vocab = docs[0].vocab
+        self.docs = {}
+
+        for doc in docs:
+            self.docs[doc.text] = doc
+
+            for sent in doc.sents:
+                self.docs[sent.text] = sent.as_doc()
+
+    def __call__(self, text):
+        if 'fail' in text:
+            raise ValueError('The pipeline failed.')
+
+        return self.docs[text.strip()]
+
+    def pipe(self, texts, batch_size=None):
+        for text in texts:
+            yield self(text)
+
+
+def use_pipeline(nlp):
+    return mock.patch.dict(pipeline.pipelines, {'en_core_web_trf': nlp})
+
+
+class CacheTests(SimpleTestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('  Cafe\u0301\r\nends.\r '), 'Caf\u00e9\nends.')
+
+    def test_cache_key(self):
+        self.assertEqual(get_cache_key('text', 'sm', 1), get_cache_key('text', 'sm', 1))
+        self.assertNotEqual(get_cache_key('text', 'sm', 1), get_cache_key('text', 'sm', 2))
+        # The parts are separated, so that moving a character from one to the other changes the key
+        self.assertNotEqual(get_cache_key('b', 'a'), get_cache_key('', 'ab'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ResultCache(1, directory).set('key', [1, 2])
+            cache = ResultCache(1, directory)
+
+            self.assertEqual(cache.get('key'), [1, 2])
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+            self.assertIsNone(cache.get('other'))
+
+    def test_concurrent_misses_are_computed_once(self):
+        cache = ResultCache(8)
+        calls = []
+        started = threading.Event()
+        results = []
+
+        def compute():
+            calls.append(None)
+            started.set()
+            time.sleep(0.5)
+
+            return 'value'
+
+        def get():
+            results.append(cache.get_or_compute('key', compute))
+
+        threads = [threading.Thread(target=get)]
+        threads[0].start()
+        started.wait(5)
+        threads += [threading.Thread(target=get) for _ in range(4)]
+
+        for thread in threads[1:]:
+            thread.start()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(cache.stats()['coalesced'], 4)
+
+    def test_failed_computation_is_not_cached(self):
+        cache = ResultCache(8)
+
+        with self.assertRaises(ValueError):
+            cache.get_or_compute('key', mock.Mock(side_effect=ValueError))
+
+        self.assertEqual(cache.get_or_compute('key', lambda: 'value'), 'value')
+
+
+class AdmissionTests(SimpleTestCase):
+    def test_full_queue_is_rejected(self):
+        admission = AdmissionController(1, 1, 1000, 10)
+        admission.acquire(10)
+        waiting = threading.Thread(target=admission.acquire, args=(10,))
+        waiting.start()
+
+        while admission.stats()['waiting'] < 1:
+            time.sleep(0.01)
+
+        with self.assertRaises(Rejection) as context:
+            admission.acquire(10)
+
+        self.assertEqual((context.exception.reason, context.exception.status), ('queue_full', 503))
+
+        admission.release(10)
+        waiting.join(5)
+        self.assertEqual(admission.stats()['running'], 1)
+
+    def test_request_missing_the_deadline_is_rejected(self):
+        admission = AdmissionController(1, 4, 1000, 0.8)
+        admission.acquire(100)
+        admission.release(100, 0.5)
+        admission.acquire(100)
+
+        # 0.5 seconds for the running request and 0.5 seconds for this one
+        with self.assertRaises(Rejection) as context:
+            admission.acquire(100)
+
+        self.assertEqual(context.exception.reason, 'deadline')
+        self.assertIsNotNone(context.exception.retry_after)
+
+    def test_idle_worker_admits_long_requests(self):
+        admission = AdmissionController(1, 4, 1000, 0.1)
+        admission.acquire(100)
+        admission.release(100, 0.5)
+        admission.acquire(500)
+        admission.release(500)
+
+        with self.assertRaises(Rejection) as context:
+            admission.acquire(100, elapsed=1.0)
+
+        self.assertEqual(context.exception.reason, 'deadline')
+
+    def test_fixed_cost_is_estimated(self):
+        admission = AdmissionController(1, 4, 10000, 10)
+
+        for size in [100, 1000] * 20:
+            admission.acquire(size)
+            admission.release(size, 0.1 + 0.001 * size)
+
+        stats = admission.stats()
+
+        self.assertAlmostEqual(stats['seconds_per_request'], 0.1, places=3)
+        self.assertAlmostEqual(stats['seconds_per_character'], 0.001, places=5)
+
+    def test_size_limits(self):
+        admission = AdmissionController(2, 4, 100, 10)
+
+        with self.assertRaises(Rejection) as context:
+            admission.acquire(101)
+
+        self.assertEqual(context.exception.status, 413)
+
+        admission.acquire(60)
+
+        with self.assertRaises(Rejection) as context:
+            admission.acquire(60)
+
+        self.assertEqual(context.exception.status, 429)
+
+
+class ValidationTests(SimpleTestCase):
+    def test_empty_description(self):
+        result = validate(' ')
+
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['problems'][0]['category'], 'no_sentences')
+
+    def test_branch_without_gateway(self):
+        result = validate('Otherwise the clerk sends the order.')
+
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['problems'][0]['category'], 'sequence_flow_change_without_gateway')
+        self.assertEqual(result['problems'][0]['sentence'], 0)
+
+    def test_indicators(self):
+        text = 'If the clerk checks the invoice, the manager signs it.\nOtherwise the clerk sends the order.'
+        result = validate(text)
+
+        self.assertTrue(result['valid'])
+        self.assertEqual(
+            [[indicator['category'] for indicator in sentence['indicators']] for sentence in result['sentences']],
+            [['split_exclusive_gateway'], ['sequence_flow_change']]
+        )
+        self.assertEqual(text[result['sentences'][1]['start']:result['sentences'][1]['end']].strip(),
+                         'Otherwise the clerk sends the order.')
+
+
+class BpmnTests(SimpleTestCase):
+    def test_serialized_elements(self):
+        elements = extract(get_doc(spacy.blank('en').vocab, 30, 3))
+        elements[1].value = 'Check "A" & <B>'
+        root = ElementTree.fromstring(''.join(serialize_bpmn(elements)))
+        namespaces = {'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL',
+                      'bpmndi': 'http://www.omg.org/spec/BPMN/20100524/DI'}
+
+        process = root.find('bpmn:process', namespaces)
+        nodes = [node for node in process if not node.tag.endswith(('laneSet', 'sequenceFlow'))]
+        flows = process.findall('bpmn:sequenceFlow', namespaces)
+        identifiers = [node.get('id') for node in nodes]
+
+        self.assertEqual(len(nodes), len(elements))
+        self.assertEqual([node.get('name') or '' for node in nodes], [element.value for element in elements])
+        self.assertEqual(len(set(identifiers)), len(identifiers))
+        self.assertEqual(len(flows), sum(len(element.predecessors or [element.predecessor]) for element in elements
+                                         if element.predecessors or element.predecessor is not None))
+
+        for flow in flows:
+            self.assertIn(flow.get('sourceRef'), identifiers)
+            self.assertIn(flow.get('targetRef'), identifiers)
+
+        shapes = {shape.get('bpmnElement') for shape in root.iter('{%s}BPMNShape' % namespaces['bpmndi'])}
+        self.assertLessEqual(set(identifiers), shapes)
+
+
+class JobTests(TestCase):
+    def test_jobs_are_claimed_by_priority_and_once(self):
+        low = submit_job('Low', priority=0)
+        first = submit_job('First', priority=5)
+        second = submit_job('Second', priority=5)
+
+        self.assertEqual(claim_job('host:1').id, first.id)
+        self.assertEqual(claim_job('host:2').id, second.id)
+        self.assertEqual(claim_job('host:1').id, low.id)
+        self.assertIsNone(claim_job('host:1'))
+
+        job = Job.objects.get(id=first.id)
+        self.assertEqual((job.status, job.worker), (Job.RUNNING, 'host:1'))
+
+    def test_jobs_of_stopped_workers_fail(self):
+        submit_job('A')
+        submit_job('B')
+        stopped = claim_job('host:1')
+        running = claim_job('host:2')
+
+        self.assertEqual(fail_running_jobs(['host:1']), 1)
+
+        stopped = Job.objects.get(id=stopped.id)
+        self.assertEqual((stopped.status, stopped.error), (Job.FAILED, worker_stopped))
+        self.assertGreater(stopped.expires_at, timezone.now() + timedelta(seconds=1))
+        self.assertEqual(Job.objects.get(id=running.id).status, Job.RUNNING)
+
+
+class ChunkingTests(SimpleTestCase):
+    text = 'The clerk checks the invoice. The manager signs it.\n\nThe clerk sends the order. ' * 20
+
+    def test_chunks_add_up_to_the_text(self):
+        chunks = get_chunks(self.text, 200)
+
+        self.assertEqual(''.join(chunks), self.text)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 200 for chunk in chunks))
+
+    def test_long_paragraphs_are_split_between_sentences(self):
+        paragraph = 'The clerk checks the invoice. ' * 20
+        chunks = get_chunks(paragraph, 100)
+
+        self.assertEqual(''.join(chunks), paragraph)
+        self.assertTrue(all(chunk.endswith('. ') for chunk in chunks))
+
+    def test_stitched_doc_has_the_tokens_of_the_whole_text(self):
+        nlp = spacy.blank('en')
+
+        with override_settings(NLP_CHUNK_SIZE=200):
+            doc = get_chunked_doc(nlp, self.text)
+
+        whole = nlp(self.text)
+
+        self.assertEqual(doc.text, self.text)
+        self.assertEqual([token.text for token in doc], [token.text for token in whole])
+        self.assertEqual([token.idx for token in doc], [token.idx for token in whole])
+
+
+class StreamingTests(SimpleTestCase):
+    def test_stream_builds_the_elements_of_the_whole_text(self):
+        doc = get_doc(spacy.blank('en').vocab, 30, 5)
+
+        with use_pipeline(StubPipeline([doc])):
+            records = list(parse_stream(doc.text))
+
+        elements = []
+
+        for record in records[:-1]:
+            if record['type'] == 'element':
+                elements.append(record['element'])
+            else:
+                index = [element.identifier for element in elements].index(record['after'])
+                elements.insert(index + 1, record['element'])
+
+        self.assertEqual(records[-1], {'type': 'end'})
+        self.assertEqual(len(get_sentence_boundaries(doc.text)), len(list(doc.sents)))
+        self.assertEqual(elements, extract(doc))
+
+
+class MetricsTests(SimpleTestCase):
+    def test_render(self):
+        metrics.requests_total.inc('unit_test', '200')
+
+        with override_settings(METRICS_DIR=None):
+            text = metrics.render()
+
+        self.assertIn('# TYPE timo_requests_total counter', text)
+        self.assertIn('timo_requests_total{endpoint="unit_test",status="200"} 1', text)
+
+    def test_histogram(self):
+        lines = metrics.stage_seconds.render({('nlp',): [0] * 6 + [1] * 7 + [0.3, 1]})
+
+        self.assertIn('timo_stage_duration_seconds_bucket{stage="nlp",le="0.25"} 0', lines)
+        self.assertIn('timo_stage_duration_seconds_bucket{stage="nlp",le="0.5"} 1', lines)
+        self.assertIn('timo_stage_duration_seconds_bucket{stage="nlp",le="+Inf"} 1', lines)
+        self.assertIn('timo_stage_duration_seconds_sum{stage="nlp"} 0.3', lines)
+
+    def test_values_of_all_workers_are_summed(self):
+        stopped = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(stopped, 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, count in [(os.getppid(), 3), (stopped, 5)]:
+                with open(os.path.join(directory, '%d.json' % pid), 'w', encoding='utf-8') as file:
+                    json.dump({
+                        'timo_requests_total': [[['index', '200'], count]],
+                        'timo_requests_in_flight': [[['index'], count]]
+                    }, file)
+
+            with override_settings(METRICS_DIR=directory):
+                values = metrics.read_values()
+
+        # The in-flight requests of the stopped worker are not counted
+        self.assertEqual(values['timo_requests_total'], {('index', '200'): 8})
+        self.assertEqual(values['timo_requests_in_flight'], {('index',): 3})
+
+
+class BatchTests(SimpleTestCase):
+    def setUp(self):
+        result_cache.clear()
+
+    def test_only_the_failing_item_gets_an_error(self):
+        vocab = spacy.blank('en').vocab
+        docs = [get_doc(vocab, 10, seed) for seed in range(2)]
+
+        with use_pipeline(StubPipeline(docs)):
+            results = parse_batch([docs[0].text, 'This will fail.', docs[1].text, 42])
+
+        self.assertEqual(results[0], {'elements': extract(docs[0])})
+        self.assertEqual(results[1], {'error': 'The pipeline failed.'})
+        self.assertEqual(results[2], {'elements': extract(docs[1])})
+        self.assertEqual(results[3], {'error': 'Process description must be a string.'})
+
+
+class DeltaTests(SimpleTestCase):
+    elements = [
+        BpmnElement('bpmn:StartEvent', '1', 'Invoice received', 'Clerk'),
+        BpmnElement('bpmn:Task', '5', 'Check invoice', 'Clerk', predecessor='1'),
+        BpmnElement('bpmn:EndEvent', 'EndEvent_5', 'Invoice checked', 'Clerk', predecessor='5')
+    ]
+
+    def test_delta_by_identifier(self):
+        elements = [
+            self.elements[0],
+            BpmnElement('bpmn:Task', '5', 'Check invoice', 'Manager', predecessor='1'),
+            BpmnElement('bpmn:Task', '9', 'Sign invoice', 'Manager', predecessor='5')
+        ]
+        delta = get_delta(self.elements, elements)
+
+        self.assertEqual(delta['added'], [elements[2]])
+        self.assertEqual(delta['removed'], ['EndEvent_5'])
+        self.assertEqual(delta['changed'], [elements[1]])
+
+    def test_content_delta_ignores_moved_identifiers(self):
+        elements = [
+            BpmnElement('bpmn:StartEvent', '3', 'Invoice received', 'Clerk'),
+            BpmnElement('bpmn:Task', '7', 'Check invoice', 'Clerk', predecessor='3'),
+            BpmnElement('bpmn:EndEvent', 'EndEvent_7', 'Invoice checked', 'Clerk', predecessor='7')
+        ]
+
+        self.assertEqual(get_content_delta(self.elements, elements), {'added': [], 'removed': [], 'changed': []})
+        self.assertEqual(len(get_delta(self.elements, elements)['removed']), 3)
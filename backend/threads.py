@@ -0,0 +1,32 @@
+import os
+
+thread_variables = [
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"
+]
+
+
+def get_cpu_count():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def get_thread_budget(workers):
+    if os.environ.get("NLP_THREADS"):
+        return int(os.environ["NLP_THREADS"])
+
+    return max(1, get_cpu_count() // max(1, workers))
+
+
+def configure_threads(threads):
+    # The environment variables only take effect if they are set before torch and numpy are imported
+    for variable in thread_variables:
+        os.environ[variable] = str(threads)
+
+    try:
+        import torch
+    except ImportError:
+        return
+
+    torch.set_num_threads(threads)
@@ -3,5 +3,19 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.index, name='index'),
+    path('api', views.index, name='index'),
+    path('api/stream', views.stream, name='stream'),
+    path('api/bpmn', views.bpmn, name='bpmn'),
+    path('api/batch', views.batch, name='batch'),
+    path('api/incremental', views.incremental, name='incremental'),
+    path('api/validate', views.validate, name='validate'),
+    path('api/rerun', views.rerun, name='rerun'),
+    path('api/jobs', views.jobs, name='jobs'),
+    path('api/jobs/<uuid:job_id>', views.job, name='job'),
+    path('api/cache', views.cache, name='cache'),
+    path('api/batching', views.batching, name='batching'),
+    path('api/admission', views.admission, name='admission'),
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
+    path('metrics', views.metrics, name='metrics'),
 ]
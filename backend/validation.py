@@ -0,0 +1,134 @@
+import threading
+
+from lemminflect import getAllInflections
+from spacy.matcher import PhraseMatcher
+from spacy.util import filter_spans
+
+from backend.nlp import role_patterns
+from backend.pipeline import get_sentencizer
+
+# The indicators checked while typing, intermediate events are left out as their indicators are too common
+validated_roles = [
+    "split_exclusive_gateway", "split_parallel_gateway", "sequence_flow_change", "join_gateway", "end_event"
+]
+
+gateway_roles = ["split_exclusive_gateway", "split_parallel_gateway"]
+
+problem_messages = {
+    "sequence_flow_change_without_gateway": "There is no open gateway whose other branch this sentence could start.",
+    "join_gateway_without_gateway": "There is no open gateway this sentence could join.",
+    "no_sentences": "The process description has no sentences."
+}
+
+indicator_matcher = None
+indicator_matcher_lock = threading.Lock()
+
+
+def validate(text):
+    # Checks a process description with the tokenizer, the sentencizer and the indicator lists of the rules only, so
+    # that it takes a few milliseconds and never needs the model. Without the parser, the indicators are only found
+    # at the start of a sentence or clause and the verbs of joins and end events by their inflections.
+    if not text.strip():
+        return {"valid": False, "sentences": [], "problems": [get_problem("no_sentences", None)]}
+
+    nlp = get_sentencizer()
+    doc = nlp(text)
+    matcher, verb_forms = get_indicator_matcher(nlp)
+    spans = filter_spans(matcher(doc, as_spans=True))
+
+    sentences = []
+    problems = []
+    open_gateways = 0
+    ended_gateway = False
+    index = 0
+
+    for number, sent in enumerate(doc.sents):
+        words = set(token.lower_ for token in sent)
+        indicators = []
+
+        while index < len(spans) and spans[index].start < sent.end:
+            span = spans[index]
+            role = span.label_
+            index += 1
+
+            if role in verb_forms:
+                if not words & verb_forms[role]:
+                    continue
+            elif not is_clause_start(doc, span.start, sent.start):
+                continue
+
+            indicators.append({
+                "category": role, "phrase": span.text, "start": span.start_char, "end": span.end_char
+            })
+
+        # The gateways are followed like the rules do: an end event closes the innermost gateway, which stays the
+        # predecessor until the next task, so that another branch of it can still be started
+        if not indicators:
+            ended_gateway = False
+
+        for indicator in indicators:
+            role = indicator["category"]
+
+            if role == "sequence_flow_change":
+                if not open_gateways and not ended_gateway:
+                    problems.append(get_problem("sequence_flow_change_without_gateway", number))
+            elif role in gateway_roles:
+                open_gateways += 1
+                ended_gateway = False
+            elif open_gateways:
+                open_gateways -= 1
+                ended_gateway = role == "end_event"
+            elif role == "join_gateway":
+                problems.append(get_problem("join_gateway_without_gateway", number))
+
+        sentences.append({"start": sent.start_char, "end": sent.end_char, "indicators": indicators})
+
+    return {"valid": not problems, "sentences": sentences, "problems": problems}
+
+
+def warm_up():
+    get_indicator_matcher(get_sentencizer())
+
+
+def is_clause_start(doc, start, sent_start):
+    # Line breaks are whitespace tokens, so they are skipped when looking for the punctuation before an indicator
+    index = start - 1
+
+    while index >= sent_start and doc[index].is_space:
+        index -= 1
+
+    return index < sent_start or doc[index].is_punct
+
+
+def get_problem(category, sentence):
+    return {"category": category, "sentence": sentence, "message": problem_messages[category]}
+
+
+def get_indicator_matcher(nlp):
+    global indicator_matcher
+
+    with indicator_matcher_lock:
+        if indicator_matcher is None:
+            matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+            verb_forms = {}
+
+            for role in validated_roles:
+                verbs, dependency, indicators = role_patterns[role]
+                matcher.add(role, [nlp.make_doc(indicator) for indicator in indicators])
+
+                if verbs:
+                    verb_forms[role] = get_verb_forms(verbs)
+
+            indicator_matcher = (matcher, verb_forms)
+
+    return indicator_matcher
+
+
+def get_verb_forms(verbs):
+    forms = set(verbs)
+
+    for verb in verbs:
+        for inflections in getAllInflections(verb, upos="VERB").values():
+            forms.update(inflections)
+
+    return forms
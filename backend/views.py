@@ -1,13 +1,274 @@
-from django.http import JsonResponse
-from backend.nlp import parse
+import json
 
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from backend.admission import admit, get_batch_size, get_controller
+from backend.batching import micro_batchers
+from backend.bpmn import serialize_bpmn
+from backend.metrics import measure, render
+from backend.readiness import get_status, require_ready
+from backend.records import encode
 
+# The modules using spaCy are imported by the views that need them, so that a worker boots and answers the health
+# checks while the pipelines load
+
+# The views of the frontend (index and validate) require the CSRF token of the page. The other endpoints are called by
+# programs without a session, so they are exempt; none of them changes anything a session owns.
+
+
+class ElementsResponse(HttpResponse):
+    # Elements are encoded by the fast encoder of the records instead of the encoder of JsonResponse
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(encode(data), **kwargs)
+
+
+@measure('index')
+@require_ready
+@admit()
 def index(request):
+    from backend.nlp import parse
+
     process_description = request.POST.get('process_description', False)
+    tier = request.POST.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
 
     if process_description:
-        results = parse(process_description)
+        results = parse(process_description, tier, request.timings)
     else:
         results = []
 
-    return JsonResponse(results, safe=False)
+    with request.timings.stage('serialization'):
+        return ElementsResponse(results)
+
+
+@csrf_exempt
+@require_POST
+@measure('stream')
+@require_ready
+@admit()
+def stream(request):
+    process_description = request.POST.get('process_description', '')
+    tier = request.POST.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        content_type = 'text/event-stream'
+        line_format = b'data: %s\n\n'
+    else:
+        content_type = 'application/x-ndjson'
+        line_format = b'%s\n'
+
+    response = StreamingHttpResponse(
+        (line_format % encode(record) for record in get_stream_records(process_description, tier)),
+        content_type=content_type
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+
+    return response
+
+
+def get_stream_records(process_description, tier):
+    from backend.streaming import parse_stream
+
+    # The status code is already sent, so an error ends the stream with an error record
+    try:
+        yield from parse_stream(process_description, tier)
+    except Exception as error:
+        yield {'type': 'error', 'error': str(error)}
+
+
+@csrf_exempt
+@require_POST
+@measure('bpmn')
+@require_ready
+@admit()
+def bpmn(request):
+    from backend.nlp import parse
+
+    process_description = request.POST.get('process_description', '')
+    tier = request.POST.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    elements = parse(process_description, tier, request.timings) if process_description else []
+
+    response = StreamingHttpResponse(serialize_bpmn(elements), content_type='application/bpmn+xml; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="process.bpmn"'
+
+    return response
+
+
+@csrf_exempt
+@require_POST
+@measure('batch')
+@require_ready
+@admit(get_batch_size)
+def batch(request):
+    from backend.nlp import parse_batch
+
+    try:
+        process_descriptions = json.loads(request.body)
+    except ValueError:
+        process_descriptions = None
+
+    if not isinstance(process_descriptions, list):
+        return JsonResponse({'error': 'The request body must be a JSON array of process descriptions.'}, status=400)
+
+    try:
+        batch_size = int(request.GET.get('batch_size', settings.NLP_BATCH_SIZE))
+    except ValueError:
+        batch_size = 0
+
+    if batch_size < 1:
+        return JsonResponse({'error': 'The batch size must be a positive integer.'}, status=400)
+
+    tier = request.GET.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    return ElementsResponse(parse_batch(process_descriptions, batch_size, tier))
+
+
+@csrf_exempt
+@require_POST
+@measure('incremental')
+@require_ready
+def incremental(request):
+    from backend.incremental import parse_incremental
+
+    process_description = request.POST.get('process_description', '')
+    session_id = request.POST.get('session', '')
+
+    if not session_id:
+        return JsonResponse({'error': 'A session identifier is required.'}, status=400)
+
+    base_version = request.POST.get('version') or None
+    tier = request.POST.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    return ElementsResponse(parse_incremental(process_description, session_id, base_version, tier))
+
+
+@csrf_exempt
+@require_POST
+@measure('rerun')
+@require_ready
+def rerun(request):
+    from backend.nlp import rerun_rules
+
+    process_description = request.POST.get('process_description', '')
+    tier = request.POST.get('tier') or None
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    elements = rerun_rules(process_description, tier)
+
+    if elements is None:
+        return JsonResponse({'error': 'There is no stored document of the process description.'}, status=404)
+
+    return ElementsResponse(elements)
+
+
+@require_POST
+@measure('validate')
+def validate(request):
+    from backend.validation import validate
+
+    return JsonResponse(validate(request.POST.get('process_description', '')))
+
+
+@csrf_exempt
+@require_POST
+def jobs(request):
+    from backend.jobs import get_job_dict, submit_job
+
+    process_description = request.POST.get('process_description', '')
+    tier = request.POST.get('tier') or None
+
+    if not process_description:
+        return JsonResponse({'error': 'A process description is required.'}, status=400)
+
+    if tier not in settings.NLP_MODELS and tier is not None:
+        return invalid_tier_response(tier)
+
+    try:
+        priority = int(request.POST.get('priority', 0))
+    except ValueError:
+        return JsonResponse({'error': 'The priority must be an integer.'}, status=400)
+
+    job = submit_job(process_description, tier, priority)
+    response = ElementsResponse(get_job_dict(job), status=202)
+    response['Location'] = reverse('job', args=[job.id])
+
+    return response
+
+
+@require_GET
+def job(request, job_id):
+    from backend.jobs import get_job_dict, wait_for_job
+
+    # With the wait parameter, the response is held back until the job is finished or the seconds have passed
+    try:
+        wait = min(max(0.0, float(request.GET.get('wait', 0))), settings.NLP_JOB_MAX_WAIT)
+    except ValueError:
+        return JsonResponse({'error': 'The wait time must be a number of seconds.'}, status=400)
+
+    job = wait_for_job(job_id, wait)
+
+    if job is None:
+        return JsonResponse({'error': 'The job does not exist or has expired.'}, status=404)
+
+    return ElementsResponse(get_job_dict(job))
+
+
+def cache(request):
+    from backend.nlp import result_cache
+
+    return JsonResponse(result_cache.stats())
+
+
+def batching(request):
+    return JsonResponse([micro_batcher.stats() for micro_batcher in list(micro_batchers.values())], safe=False)
+
+
+def admission(request):
+    return JsonResponse(get_controller().stats())
+
+
+def healthz(request):
+    return JsonResponse({'status': 'alive'})
+
+
+def readyz(request):
+    status = get_status()
+    response = JsonResponse({'status': status}, status=200 if status == 'ready' else 503)
+
+    if status == 'loading':
+        response['Retry-After'] = str(settings.NLP_RETRY_AFTER)
+
+    return response
+
+
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404('Metrics are disabled.')
+
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def invalid_tier_response(tier):
+    return JsonResponse({'error': 'Unknown model tier: ' + tier, 'tiers': list(settings.NLP_MODELS)}, status=400)
@@ -109,6 +109,83 @@ let checkProcessDescription = function (text) {
     } else {
         document.getElementById('button-create-model').setAttribute('disabled', 'disabled');
     }
+
+    validateProcessDescription(text);
+};
+
+let validationTimeout = null;
+let validationController = null;
+
+let validateProcessDescription = function (text) {
+    clearTimeout(validationTimeout);
+
+    // The process description is validated once typing pauses, an older validation still running is cancelled
+    validationTimeout = setTimeout(function () {
+        if (validationController !== null) {
+            validationController.abort();
+        }
+
+        validationController = new AbortController();
+
+        let formData = new FormData();
+        formData.append('process_description', text);
+
+        const request = new Request('/api/validate', {
+            headers: {'X-CSRFToken': document.getElementById('csrf_token').value},
+            method: 'POST',
+            body: formData,
+            signal: validationController.signal
+        });
+
+        fetch(request)
+            .then(response => {
+                if (!response.ok) {
+                    throw Error(response.statusText);
+                }
+
+                return response.json();
+            })
+            .then(data => {
+                showValidation(data);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    showValidation(null);
+                }
+            });
+    }, 250);
+};
+
+let showValidation = function (data) {
+    let feedback = document.getElementById('process-description-feedback');
+    feedback.innerHTML = '';
+    feedback.className = 'mb-3 small';
+
+    if (data === null || data.sentences.length === 0) {
+        return;
+    }
+
+    if (data.problems.length === 0) {
+        let indicators = 0;
+
+        data.sentences.forEach(function (sentence) {
+            indicators += sentence.indicators.length;
+        });
+
+        feedback.classList.add('text-muted');
+        feedback.textContent = data.sentences.length + ' sentences, ' + indicators + ' gateway, join and end indicators found.';
+
+        return;
+    }
+
+    feedback.classList.add('text-danger');
+
+    data.problems.forEach(function (problem) {
+        let line = document.createElement('div');
+        line.textContent = (problem.sentence !== null ? 'Sentence ' + (problem.sentence + 1) + ': ' : '') + problem.message;
+
+        feedback.appendChild(line);
+    });
 };
 
 let handleResponse = async function (data) {
@@ -0,0 +1,62 @@
+import gc
+import os
+import shutil
+import tempfile
+
+from backend.threads import configure_threads, get_cpu_count, get_thread_budget
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', max(1, get_cpu_count() // 2)))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+# Load the application, and with it the pipelines, before forking, so that all workers share the model weights
+# copy-on-write instead of each worker loading its own copy. With GUNICORN_PRELOAD=0 every worker starts at once and
+# loads its own copy in the background, answering the API with 503 until it is ready.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app:
+    # A loading thread of the master would not be forked with it, so the master loads the pipelines before forking
+    os.environ.setdefault('NLP_PRELOAD_IN_BACKGROUND', '0')
+
+# The workers write their metrics to a directory of this server, so that a scrape of any worker returns the sum over
+# all of them. It is created anew on every start, as the counters start at zero again.
+metrics_dir = None
+
+if os.environ.get('METRICS_ENABLED') == '1' and not os.environ.get('METRICS_DIR'):
+    metrics_dir = tempfile.mkdtemp(prefix='timo-metrics-')
+    os.environ['METRICS_DIR'] = metrics_dir
+
+# The settings are read once the environment is complete
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+from django.conf import settings  # noqa: E402
+
+
+def get_threads():
+    # Every request admitted to the queue of a worker needs a thread to wait in, one more answers the health checks
+    # while all of them are busy
+    if settings.NLP_ADMISSION:
+        return settings.NLP_ADMISSION_CONCURRENCY + settings.NLP_ADMISSION_QUEUE_SIZE + 1
+
+    return settings.NLP_MICRO_BATCH_SIZE + 1 if settings.NLP_MICRO_BATCHING else 1
+
+
+threads = int(os.environ.get('GUNICORN_THREADS', get_threads()))
+
+# The master only loads and warms up the pipelines, the workers get the thread budget after the fork
+configure_threads(1)
+
+
+def when_ready(server):
+    # Objects loaded so far are moved out of the garbage collector's reach, so that collections in the workers do not
+    # touch and thereby copy their memory pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    configure_threads(get_thread_budget(workers))
+
+
+def on_exit(server):
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
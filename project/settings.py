@@ -79,6 +79,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # The web and job workers write the jobs concurrently and wait for each other's locks
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
@@ -122,3 +126,117 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
+
+
+# Natural language processing
+
+# Pipelines by tier, from the fastest to the most accurate one
+NLP_MODELS = {
+    'sm': 'en_core_web_sm',
+    'md': 'en_core_web_md',
+    'lg': 'en_core_web_lg',
+    'trf': 'en_core_web_trf',
+}
+
+# Tier used unless a request asks for another one
+NLP_MODEL_TIER = os.environ.get('NLP_MODEL_TIER', 'trf')
+
+# Inference mode of transformer pipelines: 'default', or 'quantized' for int8 weights and no autograd tracking
+# (check the results with the verify_inference command)
+NLP_INFERENCE = os.environ.get('NLP_INFERENCE', 'default')
+
+# Tiers loaded when the application starts, the others are loaded on their first request
+NLP_PRELOAD_TIERS = os.environ.get('NLP_PRELOAD_TIERS', NLP_MODEL_TIER).split(',')
+
+# Parse with the fast tier first and only with the requested tier when the elements of the fast one look unreliable,
+# e.g. because of verbs without a business object or gateways that are never closed
+NLP_CASCADE = os.environ.get('NLP_CASCADE', '0') == '1'
+
+NLP_CASCADE_TIER = os.environ.get('NLP_CASCADE_TIER', 'sm')
+
+# Load and warm up the pipelines when the server starts (project/wsgi.py) instead of on the first request, management
+# commands load them when they need them
+NLP_PRELOAD = os.environ.get('NLP_PRELOAD', '1') == '1'
+
+# Load the pipelines in a background thread, so that the application starts at once and answers /healthz and /readyz,
+# API requests get a 503 until the pipelines are ready
+NLP_PRELOAD_IN_BACKGROUND = os.environ.get('NLP_PRELOAD_IN_BACKGROUND', '1') == '1'
+
+# Seconds after which clients should retry a request that arrived while the pipelines were loading
+NLP_RETRY_AFTER = 10
+
+NLP_WARM_UP_FILE = BASE_DIR / 'static' / 'examples' / 'process_1.txt'
+
+# Number of process descriptions passed through the pipeline at once by the batch API
+NLP_BATCH_SIZE = 32
+
+# Longer process descriptions are split into chunks of at most this many characters at paragraph and sentence
+# boundaries, which bounds the memory the pipeline needs
+NLP_CHUNK_SIZE = 10000
+
+# Number of chunks passed through the pipeline at once
+NLP_CHUNK_BATCH_SIZE = 1
+
+# Number of sentences passed through the pipeline at once by the streaming API, small batches send elements sooner
+NLP_STREAM_BATCH_SIZE = 4
+
+# Number of verb inflections kept in memory per worker, they are shared between all process descriptions
+NLP_INFLECTION_CACHE_SIZE = 4096
+
+# Number of results kept in memory per worker, 0 disables the in-memory cache
+NLP_CACHE_SIZE = 256
+
+# Directory of the on-disk result cache shared between workers, disabled if not set
+NLP_CACHE_DIR = os.environ.get('NLP_CACHE_DIR') or None
+
+# Directory of the parsed documents by model version, from which the extraction rules can be run again without the
+# pipeline (see the rerun_rules command), disabled if not set
+NLP_DOC_STORE_DIR = os.environ.get('NLP_DOC_STORE_DIR') or None
+
+# Number of editing sessions whose sentences are kept per worker by the incremental API
+NLP_INCREMENTAL_SESSIONS = 128
+
+# Number of neighbouring sentences on each side that are parsed together with a changed sentence
+NLP_INCREMENTAL_CONTEXT = 1
+
+# Collect concurrent requests of threaded workers and run them through the pipeline together
+NLP_MICRO_BATCHING = os.environ.get('NLP_MICRO_BATCHING', '0') == '1'
+
+# Seconds a request waits for others to join its batch
+NLP_MICRO_BATCH_WINDOW = 0.01
+
+NLP_MICRO_BATCH_SIZE = 16
+
+# Admission control of the API: each worker converts at most NLP_ADMISSION_CONCURRENCY process descriptions at a time
+# and queues at most NLP_ADMISSION_QUEUE_SIZE others. Requests that would not be answered before the deadline, judged
+# by the recent service time, or that exceed the budget of characters being converted are turned away at once.
+NLP_ADMISSION = os.environ.get('NLP_ADMISSION', '1') == '1'
+
+# With micro-batching, as many requests as fit into a batch run at once, so that they can be batched together
+NLP_ADMISSION_CONCURRENCY = int(os.environ.get(
+    'NLP_ADMISSION_CONCURRENCY', NLP_MICRO_BATCH_SIZE if NLP_MICRO_BATCHING else 1
+))
+
+NLP_ADMISSION_QUEUE_SIZE = int(os.environ.get('NLP_ADMISSION_QUEUE_SIZE', '8'))
+
+# Characters queued or being converted per worker, a single longer process description is rejected with 413
+NLP_ADMISSION_BUDGET = int(os.environ.get('NLP_ADMISSION_BUDGET', '100000'))
+
+# Seconds within which a request has to be answered, below the proxy_read_timeout of nginx (60 seconds)
+NLP_ADMISSION_DEADLINE = float(os.environ.get('NLP_ADMISSION_DEADLINE', '50'))
+
+# Seconds the result of a job of the asynchronous API is kept after it finished
+NLP_JOB_EXPIRY = int(os.environ.get('NLP_JOB_EXPIRY', 24 * 60 * 60))
+
+# Seconds a request for the status of a job waits at most for it to finish (long polling)
+NLP_JOB_MAX_WAIT = 20
+
+# Seconds between the checks of the job workers for new jobs and of waiting requests for finished ones
+NLP_JOB_POLL_INTERVAL = 0.25
+
+# Collect request metrics and serve them in the Prometheus text format at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+# Directory in which every worker process writes its metrics, so that /metrics returns the sum over all workers.
+# gunicorn.conf.py sets it to a new temporary directory, without it every process reports only its own metrics.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
@@ -2,5 +2,5 @@ from django.urls import include, path
 
 urlpatterns = [
     path('', include('frontend.urls')),
-    path('api', include('backend.urls')),
+    path('', include('backend.urls')),
 ]
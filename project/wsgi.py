@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Only the server loads the pipelines at startup, management commands load them when they need them
+from backend.readiness import preload  # noqa: E402
+
+preload()